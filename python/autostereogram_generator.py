@@ -1,27 +1,202 @@
+import os
+import sys
+import time
+from functools import lru_cache
+from multiprocessing import Pool, shared_memory
+
 from PIL import Image
 import numpy as np
 
-# 深さマップの読み込み（grayscale）
-depth = Image.open("depth_map.png").convert("L")
-depth_arr = np.array(depth)
+# 設定値
+max_offset = 20  # 最大ずらす幅
+TILE_ROWS = 256  # 一度に処理する行数（8K でも作業用の配列がこの行数分で済む）
 
-# ベースの繰り返しパターン（noiseなど）
-pattern = Image.open("pattern.png")
-pattern_arr = np.array(pattern)
 
-h, w = depth_arr.shape
-pw, ph, _ = pattern_arr.shape
+def load_pattern(path):
+    """ パターン画像を (高さ, 幅, 3) の uint8 配列で読み込む """
+    return np.array(Image.open(path).convert("RGB"))
 
-output = np.zeros((h, w, 3), dtype=np.uint8)
 
-# 設定値
-max_offset = 20  # 最大ずらす幅
+@lru_cache(maxsize=4)
+def cached_pattern(path):
+    """ 同じパターンを何度も読み込まないようにする（読み取り専用で返す） """
+    arr = load_pattern(path)
+    arr.setflags(write=False)
+    return arr
+
+
+def offset_table(max_offset):
+    """
+    深さ 0〜255 → ずらす量 の表。
+    1画素ずつ int(depth / 255.0 * max_offset) を計算するのと同じ値になる。
+    """
+    return (np.arange(256) / 255.0 * max_offset).astype(np.intp)
+
+
+def render_rows(depth_arr, pattern_arr, y0, y1, out, table):
+    """ depth_arr の y0〜y1 行目を、out（同じ行範囲の出力）に書き込む """
+    ph, pw = pattern_arr.shape[:2]
+    w = depth_arr.shape[1]
+    src_x = table[depth_arr[y0:y1]]        # ずらす量 (行数, 幅)
+    src_x += np.arange(w)
+    src_x %= pw                            # パターン内の位置
+    src_y = (np.arange(y0, y1) % ph)[:, None]
+    out[...] = pattern_arr[src_y, src_x]
+
+
+def generate_autostereogram(depth_arr, pattern_arr, max_offset=max_offset, tile_rows=TILE_ROWS, out=None):
+    """
+    深さマップ (h, w) の uint8 配列とパターン (ph, pw, 3) から出力画像 (h, w, 3) を作る。
+    行のまとまり（タイル）ごとに、ずらす量の計算とパターンの取り出しを配列演算で行う。
+    """
+    h, w = depth_arr.shape
+    if out is None:
+        out = np.empty((h, w, 3), dtype=np.uint8)
+    table = offset_table(max_offset)
+    for y0 in range(0, h, tile_rows):
+        y1 = min(y0 + tile_rows, h)
+        render_rows(depth_arr, pattern_arr, y0, y1, out[y0:y1], table)
+    return out
+
+
+def generate_autostereogram_reference(depth_arr, pattern_arr, max_offset=max_offset):
+    """ 1画素ずつ計算する元の実装（結果の確認用。パターンの高さと幅の取り違えは直してある） """
+    h, w = depth_arr.shape
+    ph, pw = pattern_arr.shape[:2]
+    output = np.zeros((h, w, 3), dtype=np.uint8)
+    for y in range(h):
+        for x in range(w):
+            d = depth_arr[y, x] / 255.0      # 0-1 の深さ
+            offset = int(d * max_offset)     # ずらす量
+            src_x = (x + offset) % pw         # パターン内の位置
+            output[y, x] = pattern_arr[y % ph, src_x]
+    return output
+
+
+def benchmark(width=1920, height=1080, seed=0):
+    """ ランダムな深さマップで、元の実装と一致するか・どれだけ速いかを確かめる """
+    rng = np.random.default_rng(seed)
+    depth_arr = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+    pattern_arr = rng.integers(0, 256, size=(120, 90, 3), dtype=np.uint8)
+
+    t0 = time.perf_counter()
+    fast = generate_autostereogram(depth_arr, pattern_arr)
+    t_fast = time.perf_counter() - t0
+
+    # 元の実装は遅いので先頭の数行だけで比べ、全体の時間は行数で換算する
+    n_rows = 16
+    t0 = time.perf_counter()
+    ref = generate_autostereogram_reference(depth_arr[:n_rows], pattern_arr)
+    t_ref = (time.perf_counter() - t0) * height / n_rows
+
+    same = np.array_equal(fast[:n_rows], ref)
+    print(f"{width}x{height}: 配列演算 {t_fast:.3f}s / 元の実装（換算） {t_ref:.1f}s "
+          f"({t_ref / t_fast:.0f}倍), 一致: {same}")
+
+
+# --- バッチ / アニメーション ---
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+
+def iter_depth_frames(source):
+    """
+    深さマップのフレームを順に返す。
+    source がディレクトリなら中の画像をファイル名順に（パスのまま返し、読み込みはワーカーで行う）、
+    動画ファイルなら OpenCV で1フレームずつ読んでグレースケールの配列で返す。
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(source, name)
+        return
+    try:
+        import cv2
+    except ImportError:
+        raise ImportError("動画から読み込むには opencv-python が必要です") from None
+    cap = cv2.VideoCapture(source)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    finally:
+        cap.release()
+
+
+_worker_shm = None
+_worker_pattern = None
+_worker_settings = None
+
+
+def _open_shared(name):
+    try:
+        # 3.13 以降：ワーカー側ではリソーストラッカーに登録しない（削除は親が行う）
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(shm_name, shape, out_dir, max_offset, tile_rows):
+    global _worker_shm, _worker_pattern, _worker_settings
+    _worker_shm = _open_shared(shm_name)
+    _worker_pattern = np.ndarray(shape, dtype=np.uint8, buffer=_worker_shm.buf)
+    _worker_settings = (out_dir, max_offset, tile_rows)
+
+
+def _render_frame(task):
+    index, frame = task
+    out_dir, offset, tile_rows = _worker_settings
+    if isinstance(frame, str):
+        frame = np.array(Image.open(frame).convert("L"))
+    output = generate_autostereogram(frame, _worker_pattern, offset, tile_rows)
+    path = os.path.join(out_dir, f"stereogram_{index:06d}.png")
+    Image.fromarray(output).save(path)
+    return path
+
+
+def render_batch(source, pattern_path, out_dir, processes=None, max_offset=max_offset,
+                 tile_rows=TILE_ROWS, report_every=50):
+    """
+    source（ディレクトリか動画）の深さマップを全部ステレオグラムにして out_dir に書き出す。
+    パターンは1回だけ読み込んで共有メモリに置き、各ワーカーはそれを参照する。
+    フレームはプロセスプールに配り、書き出したファイルのパスをフレーム順に返す（ジェネレータ）。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    pattern_arr = cached_pattern(pattern_path)
+    shm = shared_memory.SharedMemory(create=True, size=pattern_arr.nbytes)
+    try:
+        np.ndarray(pattern_arr.shape, dtype=np.uint8, buffer=shm.buf)[...] = pattern_arr
+        initargs = (shm.name, pattern_arr.shape, out_dir, max_offset, tile_rows)
+        with Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            t0 = time.perf_counter()
+            n = 0
+            # imap は終わった順ではなく投げた順に返すので、出力の順番が保たれる
+            for path in pool.imap(_render_frame, enumerate(iter_depth_frames(source)), chunksize=2):
+                n += 1
+                if report_every and n % report_every == 0:
+                    print(f"{n} フレーム ({n / (time.perf_counter() - t0):.1f} fps)")
+                yield path
+            elapsed = time.perf_counter() - t0
+            if n:
+                print(f"合計 {n} フレーム / {elapsed:.1f}s ({n / elapsed:.1f} fps)")
+    finally:
+        shm.close()
+        shm.unlink()
 
-for y in range(h):
-    for x in range(w):
-        d = depth_arr[y, x] / 255.0      # 0-1 の深さ
-        offset = int(d * max_offset)     # ずらす量
-        src_x = (x + offset) % pw         # パターン内の位置
-        output[y, x] = pattern_arr[y % ph, src_x]
 
-Image.fromarray(output).save("autostereogram.png")
\ No newline at end of file
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+        benchmark(7680, 4320)
+    elif len(sys.argv) >= 4:
+        # python autostereogram_generator.py <深さマップのディレクトリ or 動画> <パターン> <出力ディレクトリ>
+        for _ in render_batch(sys.argv[1], sys.argv[2], sys.argv[3]):
+            pass
+    else:
+        # 深さマップの読み込み（grayscale）
+        depth_arr = np.array(Image.open("depth_map.png").convert("L"))
+        # ベースの繰り返しパターン（noiseなど）
+        pattern_arr = load_pattern("pattern.png")
+        output = generate_autostereogram(depth_arr, pattern_arr)
+        Image.fromarray(output).save("autostereogram.png")
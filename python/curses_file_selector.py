@@ -1,54 +1,461 @@
 import os
+import time
 import curses
+import heapq
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
 
 def list_files(directory):
     """ 指定したディレクトリのファイル一覧を取得 """
     return os.listdir(directory)
 
+
+class DirectoryScanner:
+    """
+    os.scandir でディレクトリをバックグラウンドスレッドから少しずつ読み込むクラス。
+    50万件のようなフォルダでも、読み込み完了を待たずに先頭から表示できる。
+    """
+    def __init__(self, directory, batch_size=1000):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.names = []          # 読み込み済みのファイル名（追記のみ）
+        self.done = False        # 走査が終わったか
+        self.error = None        # 走査中の例外
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        batch = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    batch.append(entry.name)
+                    if len(batch) >= self.batch_size:
+                        # ロックを取るのはバッチ単位だけにする
+                        with self._lock:
+                            self.names.extend(batch)
+                        batch = []
+        except OSError as e:
+            self.error = e
+        finally:
+            with self._lock:
+                self.names.extend(batch)
+            self.done = True
+
+    def count(self):
+        with self._lock:
+            return len(self.names)
+
+    def get(self, start, stop):
+        """ [start, stop) の範囲だけを取り出す（画面に見えている分のみ） """
+        with self._lock:
+            return self.names[start:stop]
+
+
+class FuzzyIndex:
+    """
+    絞り込み用のインデックス。
+    小文字化した名前と、トライグラム -> 名前ID（昇順）の転置リストを一度だけ作る。
+    スキャナーの読み込みに追従して、バックグラウンドで少しずつ伸びていく。
+    """
+    def __init__(self, scanner, batch_size=5000):
+        self.scanner = scanner
+        self.batch_size = batch_size
+        self.lower = []          # 小文字化した名前（IDはスキャナーと同じ並び）
+        self.trigrams = {}       # "abc" -> array('I', [ID, ...])
+        self.size = 0            # インデックス済みの件数
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            # done を先に読んでおけば、終了直前に追記された分も取りこぼさない
+            done = self.scanner.done
+            names = self.scanner.get(self.size, self.size + self.batch_size)
+            if names:
+                self._add(names)
+            elif done:
+                break
+            else:
+                time.sleep(0.05)
+
+    def _add(self, names):
+        trigrams = self.trigrams
+        base = self.size
+        for offset, name in enumerate(names):
+            low = name.lower()
+            # lower を先に伸ばしておく（転置リストに載ったIDは必ず引ける）
+            self.lower.append(low)
+            i = base + offset
+            for gram in {low[k:k + 3] for k in range(len(low) - 2)}:
+                posting = trigrams.get(gram)
+                if posting is None:
+                    trigrams[gram] = array('I', (i,))
+                else:
+                    posting.append(i)
+        self.size = base + len(names)
+
+    def matches(self, tokens, parent=None):
+        """
+        tokens（小文字）をすべて部分文字列として含む名前を探す MatchScan を返す（まだ調べない）。
+        parent（直前のクエリの MatchScan）があれば、その一致済みの分と未調査の分だけを候補にする。
+        トライグラムの転置リストの方が小さければ、そちらを起点にする。
+        """
+        size = self.size
+        posting = None
+        for token in tokens:
+            for k in range(len(token) - 2):
+                p = self.trigrams.get(token[k:k + 3])
+                if p is None:
+                    return MatchScan(self.lower, tokens, [], size)
+                if posting is None or len(p) < len(posting):
+                    posting = p
+        if posting is not None and (parent is None or len(posting) < parent.remaining()):
+            # 転置リストは昇順なので size より後ろ（まだ未確定の分）を切り落とす
+            cut = bisect_left(posting, size)
+            if len(tokens) == 1 and len(tokens[0]) == 3:
+                return MatchScan(self.lower, tokens, [], size, ids=posting[:cut])  # 転置リストがそのまま答え
+            return MatchScan(self.lower, tokens, [(posting, 0, cut)], size)
+        if parent is not None:
+            # 直前の候補はコピーせず、(列, 開始, 終了) の区間として参照する
+            segments = [(parent.ids, 0, len(parent.ids))] + parent.segments
+            return MatchScan(self.lower, tokens, segments, parent.size)
+        return MatchScan(self.lower, tokens, [(range(size), 0, size)], size)
+
+    def score(self, i, tokens):
+        """ ファジースコア（小さいほど上位）：先頭一致 > 単語の区切りで一致 > それ以外 """
+        low = self.lower[i]
+        pos = low.find(tokens[0])
+        if pos == 0:
+            kind = 0
+        elif not low[pos - 1].isalnum():
+            kind = 1
+        else:
+            kind = 2
+        return (kind, pos, len(low), low)
+
+
+class MatchScan:
+    """
+    1つのクエリの一致結果。候補の区間を先頭から少しずつ調べて ids を伸ばしていく。
+    画面を埋める分だけ先に調べ、残りは入力待ちの合間に続きを調べる（1打鍵で全件を走査しない）。
+    """
+    CHUNK = 2048     # 時間の確認をはさむ間隔（件数）
+
+    def __init__(self, lower, tokens, segments, size, ids=None):
+        self.lower = lower
+        self.tokens = tokens
+        self.segments = segments   # まだ調べていない候補 [(IDの列, 列内の開始位置, 終了位置)]（IDの昇順）
+        self.size = size           # 候補に含めたインデックス済み件数
+        self.ids = [] if ids is None else ids
+        self.ranked = None         # 調べ終わってから並べ替えた表示用の名前ID
+
+    @property
+    def complete(self):
+        return not self.segments
+
+    def remaining(self):
+        """ 子のクエリの候補になる件数（一致済み + 未調査） """
+        return len(self.ids) + sum(stop - start for _, start, stop in self.segments)
+
+    def extend(self, size):
+        """ 後からインデックスされた [self.size, size) を未調査の候補に加える """
+        if size > self.size:
+            self.segments.append((range(self.size, size), 0, size - self.size))
+            self.size = size
+            self.ranked = None
+
+    def advance(self, deadline, want=None):
+        """ deadline（perf_counter の時刻）まで、または want 件見つかるまで調べる """
+        lower, tokens, ids = self.lower, self.tokens, self.ids
+        token = tokens[0] if len(tokens) == 1 else None
+        while self.segments:
+            seq, start, stop = self.segments[0]
+            end = min(stop, start + self.CHUNK)
+            if token is not None:
+                ids.extend([i for i in seq[start:end] if token in lower[i]])
+            else:
+                ids.extend([i for i in seq[start:end] if all(t in lower[i] for t in tokens)])
+            if end == stop:
+                self.segments.pop(0)
+            else:
+                self.segments[0] = (seq, end, stop)
+            if (want is not None and len(ids) >= want) or time.perf_counter() >= deadline:
+                break
+
+
+class IncrementalFilter:
+    """
+    入力中のクエリで候補を絞り込むクラス。
+    1文字追加するたびに直前の候補集合から絞り込み、Backspace ではスタックから戻すだけにする。
+    クエリはスペース区切りで複数語（AND）を指定できる。
+    1打鍵では画面の行数分が見つかるか BUDGET 秒たつまでだけ調べ、続きは advance() で進める。
+    """
+    # 1回の push / advance で調べる時間の上限（秒）
+    BUDGET = 0.010
+    # 候補がこれより多いときは並べ替えを省略する（1打鍵あたりの処理時間を抑えるため）
+    RANK_LIMIT = 5000
+
+    def __init__(self, index, limit):
+        self.index = index
+        self.limit = limit       # 表示する件数の上限（画面の行数）
+        self.query = ""
+        self._stack = []         # (クエリ, MatchScan)
+
+    def push(self, ch):
+        self.query += ch
+        tokens = self.query.lower().split()
+        if self._stack and (ch.isspace() or not tokens):
+            # 区切りのスペースだけなら条件は変わらないので直前の結果を使い回す
+            self._stack.append((self.query, self._stack[-1][1]))
+            return
+        parent = self._stack[-1][1] if self._stack else None
+        scan = self.index.matches(tokens, parent)
+        scan.advance(time.perf_counter() + self.BUDGET, want=self.limit)
+        self._stack.append((self.query, scan))
+        self._rank(scan)
+
+    def pop(self):
+        """ 1文字戻す。直前の候補と調べた位置はスタックに残っているので再計算しない """
+        self.query = self.query[:-1]
+        if self._stack:
+            self._stack.pop()
+
+    def refresh(self):
+        """ 絞り込み後にインデックスが伸びていれば、増えた分を未調査の候補に加える """
+        if self._stack:
+            self._stack[-1][1].extend(self.index.size)
+
+    def advance(self):
+        """ 調べ終わっていなければ BUDGET 秒だけ続きを調べる（入力待ちの合間に呼ぶ） """
+        if self._stack and not self.complete:
+            scan = self._stack[-1][1]
+            scan.advance(time.perf_counter() + self.BUDGET)
+            self._rank(scan)
+
+    def _rank(self, scan):
+        """ 調べ終わっていて件数が少なければ、表示用に並べ替えておく """
+        if scan.complete and scan.ranked is None and scan.tokens and len(scan.ids) <= self.RANK_LIMIT:
+            scan.ranked = heapq.nsmallest(
+                self.limit, scan.ids, key=lambda i: self.index.score(i, scan.tokens))
+
+    @property
+    def complete(self):
+        return self._stack[-1][1].complete if self._stack else True
+
+    @property
+    def matches(self):
+        return len(self._stack[-1][1].ids) if self._stack else 0
+
+    @property
+    def results(self):
+        if not self._stack:
+            return []
+        scan = self._stack[-1][1]
+        if scan.ranked is not None and len(scan.ranked) >= min(self.limit, len(scan.ids)):
+            return scan.ranked
+        return scan.ids[:self.limit]
+
+    def count(self):
+        return len(self.results)
+
+    def get(self, start, stop):
+        return [self.index.scanner.names[i] for i in self.results[start:stop]]
+
+
+def fit_width(text, max_cols):
+    """
+    表示幅（桁数）が max_cols に収まるところまで text を切る。
+    全角（East Asian Width が W/F）の文字は2桁、結合文字は0桁として数える。
+    （文字数で切ると日本語のファイル名が2倍の幅になり、次の行に折り返してしまう）
+    """
+    cols = 0
+    for i, ch in enumerate(text):
+        if unicodedata.combining(ch):
+            w = 0
+        elif unicodedata.east_asian_width(ch) in ("W", "F"):
+            w = 2
+        else:
+            w = 1
+        if cols + w > max_cols:
+            return text[:i]
+        cols += w
+    return text
+
+
+class VirtualListView:
+    """
+    current_index の周辺だけを描画する仮想化リスト。
+    前回描画した内容を行ごとに覚えておき、変わった行だけ addstr する。
+    """
+    def __init__(self, stdscr):
+        self.stdscr = stdscr
+        self.top = 0             # 画面の一番上に表示しているインデックス
+        self._drawn = {}         # 行番号 -> (文字列, 属性)
+        self.resize()
+
+    def resize(self):
+        self.height, self.width = self.stdscr.getmaxyx()
+        # 最終行はステータス表示に使う
+        self.rows = max(1, self.height - 1)
+        self._drawn.clear()
+        self.stdscr.erase()
+
+    def scroll_to(self, index):
+        """ index が画面内に入るように top を調整する """
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+
+    def _put(self, row, text, attr=0):
+        # 右端に書くと curses が例外を出すので、表示幅で width-1 桁までに切る
+        # （制御文字は幅が決まらないので ? にする）
+        text = "".join(ch if ch.isprintable() else "?" for ch in text)
+        text = fit_width(text, max(0, self.width - 1))
+        if self._drawn.get(row) == (text, attr):
+            return
+        try:
+            self.stdscr.move(row, 0)
+            self.stdscr.clrtoeol()
+            self.stdscr.addnstr(row, 0, text, len(text), attr)
+        except curses.error:
+            pass  # 端末が縮んだ直後や最終行の右下の桁への書き込み：次の描画で書き直す
+        self._drawn[row] = (text, attr)
+
+    def draw(self, source, current_index, status):
+        """ source は get(start, stop) を持つもの（スキャナーか絞り込み結果） """
+        self.scroll_to(current_index)
+        visible = source.get(self.top, self.top + self.rows)
+        for row in range(self.rows):
+            idx = self.top + row
+            if row < len(visible):
+                if idx == current_index:
+                    # カーソル位置（選択中のファイル）
+                    self._put(row, f"> {visible[row]}", curses.A_REVERSE)
+                else:
+                    self._put(row, f"  {visible[row]}")
+            else:
+                self._put(row, "")
+        self.show_status(status)
+
+    def show_status(self, text):
+        """ 最終行にステータス（件数や選択結果）を表示する """
+        self._put(self.height - 1, text, curses.A_BOLD)
+        self.stdscr.refresh()
+
+
 def main(stdscr, directory):
     curses.curs_set(0)  # カーソルを非表示にする
+    if hasattr(curses, "set_escdelay"):
+        curses.set_escdelay(25)  # Escキーの反応を速くする
     stdscr.clear()
+    # 走査中も画面を更新できるように getch をタイムアウト付きにする
+    stdscr.timeout(100)
+
+    # ファイル一覧をバックグラウンドで取得し、絞り込み用インデックスもそれに追従させる
+    scanner = DirectoryScanner(directory).start()
+    index = FuzzyIndex(scanner).start()
+    view = VirtualListView(stdscr)
 
-    # ファイル一覧を取得
-    files = list_files(directory)
-    if not files:
-        stdscr.addstr(0, 0, "フォルダにファイルがありません")
-        stdscr.refresh()
-        stdscr.getch()
-        return
+    # 絞り込みモード中は None 以外（"/" で開始、Esc で終了）
+    filtering = None
 
     # 選択中のインデックス
     current_index = 0
 
     while True:
-        stdscr.clear()
+        total = scanner.count()
+        if scanner.done and total == 0:
+            message = "フォルダにファイルがありません"
+            if scanner.error is not None:
+                message = f"フォルダを読み込めません: {scanner.error}"
+            stdscr.timeout(-1)
+            view._put(0, message)
+            stdscr.refresh()
+            stdscr.getch()
+            return
 
-        # ファイル一覧を描画
-        for idx, file in enumerate(files):
-            if idx == current_index:
-                # カーソル位置（選択中のファイル）
-                stdscr.addstr(idx, 0, f"> {file}", curses.A_REVERSE)
-            else:
-                stdscr.addstr(idx, 0, f"  {file}")
+        state = "" if scanner.done else " (読み込み中...)"
+        if filtering is not None:
+            filtering.refresh()
+            filtering.advance()
+            source, total = filtering, filtering.count()
+            current_index = min(current_index, max(0, total - 1))
+            more = "" if filtering.complete else "+"
+            status = f"/{filtering.query}  {filtering.matches}{more}件{state}"
+            # 調べ終わるまでは入力を待たずに続きを調べる
+            stdscr.timeout(100 if filtering.complete else 0)
+        else:
+            source = scanner
+            status = f"{current_index + 1 if total else 0}/{total}{state}"
+            stdscr.timeout(100)
+        view.draw(source, current_index, status)
 
-        stdscr.refresh()
+        # キー入力を待つ（絞り込みの文字入力も受けるので get_wch を使う）
+        try:
+            key = stdscr.get_wch()
+        except curses.error:
+            continue  # タイムアウト：読み込みの進み具合だけ反映する
 
-        # キー入力を待つ
-        key = stdscr.getch()
+        if filtering is not None:
+            # 絞り込みモードの文字入力
+            if key == "\x1b":
+                filtering = None
+                current_index = 0
+                continue
+            if key in (curses.KEY_BACKSPACE, "\x7f", "\b"):
+                if filtering.query:
+                    filtering.pop()
+                else:
+                    filtering = None
+                current_index = 0
+                continue
+            if isinstance(key, str) and key.isprintable():
+                filtering.push(key)
+                current_index = 0
+                continue
+        elif key == "/":
+            filtering = IncrementalFilter(index, limit=view.rows)
+            current_index = 0
+            continue
 
+        total = source.count()
         # 矢印キーの処理
         if key == curses.KEY_UP and current_index > 0:
             current_index -= 1
-        elif key == curses.KEY_DOWN and current_index < len(files) - 1:
+        elif key == curses.KEY_DOWN and current_index < total - 1:
             current_index += 1
-        elif key == ord('\n'):
+        elif key == curses.KEY_PPAGE:
+            current_index = max(0, current_index - view.rows)
+        elif key == curses.KEY_NPAGE:
+            current_index = max(0, min(total - 1, current_index + view.rows))
+        elif key == curses.KEY_HOME:
+            current_index = 0
+        elif key == curses.KEY_END:
+            current_index = max(0, total - 1)
+        elif key == curses.KEY_RESIZE:
+            view.resize()
+            if filtering is not None:
+                filtering.limit = view.rows
+        elif key in ("\n", curses.KEY_ENTER) and total:
             # Enterキーが押されたら選択を確定
-            stdscr.addstr(len(files), 0, f"選択: {files[current_index]}")
-            stdscr.refresh()
+            selected = source.get(current_index, current_index + 1)[0]
+            stdscr.timeout(-1)
+            view.show_status(f"選択: {selected}")
             stdscr.getch()  # 確認のためにもう一度キー入力を待つ
             break
 
 if __name__ == "__main__":
     # 対象のディレクトリ
     directory = "./"  # ここをリストしたいフォルダに変更する
-    curses.wrapper(main, directory)
\ No newline at end of file
+    curses.wrapper(main, directory)
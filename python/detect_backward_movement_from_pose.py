@@ -1,39 +1,207 @@
-import pandas as pd
+from dataclasses import dataclass
+
 import numpy as np
 
-# 例: カメラの位置と向きのデータ
-df = pd.DataFrame({
-    "frame": [0, 1, 2, 3, 4],
-    "cam_x": [0.0, 0.5, 1.0, 0.7, 0.4],
-    "cam_z": [0.0, 0.0, 0.0, 0.0, 0.0],
-    # yaw は「どっちを向いているか」（ラジアン）
-    # ここでは全部 +x 方向を向いているケースで仮定
-    "yaw":   [0.0, 0.0, 0.0, 0.0, 0.0],
-})
-
-# 1. 向きベクトル（前方向）の算出
-#    yaw を使って、カメラの「前向き」単位ベクトル f = (cos(yaw), sin(yaw)) を作る
-df["fx"] = np.cos(df["yaw"])
-df["fz"] = np.sin(df["yaw"])
-
-# 2. フレーム間の移動ベクトル d_t = C_t - C_{t-1}
-df["dx"] = df["cam_x"].diff()  # x方向の変化量
-df["dz"] = df["cam_z"].diff()  # z方向の変化量
-
-# 3. 一つ前のフレームの前向きベクトル f_{t-1} を用意
-prev_fx = df["fx"].shift(1)
-prev_fz = df["fz"].shift(1)
-
-# 4. 移動ベクトル d_t を f_{t-1} に投影（= 内積）する
-#    s_t = dx * fx_{t-1} + dz * fz_{t-1}
-df["step_forward_component"] = df["dx"] * prev_fx + df["dz"] * prev_fz
-
-# 5. 「手前に下がったか？」の判定
-#    前向き成分がマイナスなら後退（手前に下がっている）
-#    ノイズ対策で少ししきい値を入れる（例: -0.01 未満）
-threshold = -0.01
-df["moved_backward"] = df["step_forward_component"] < threshold
-
-print(df[["frame", "cam_x", "cam_z",
-          "dx", "dz",
-          "step_forward_component", "moved_backward"]])
\ No newline at end of file
+# 「手前に下がったか？」のしきい値（前向き成分がこれ未満なら後退。ノイズ対策で少しマイナス）
+DEFAULT_THRESHOLD = -0.01
+
+
+@dataclass
+class BackwardEvent:
+    """連続して後退していた区間（カメラごと）"""
+    camera_id: object
+    start_frame: int
+    end_frame: int
+    n_frames: int
+    backward_distance: float   # 区間内の後退量の合計（-Σ s_t）
+    peak_step: float           # 区間内で一番大きく下がったフレームの s_t（最小値）
+
+
+def camera_boundaries(camera_id):
+    """カメラIDの並びから、各カメラの先頭行インデックスを返す"""
+    camera_id = np.asarray(camera_id)
+    if len(camera_id) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, camera_id[1:] != camera_id[:-1]])
+
+
+def step_forward_component(camera_id, cam_x, cam_z, yaw,
+                           prev_x=None, prev_z=None, prev_yaw=None):
+    """
+    移動ベクトル d_t = C_t - C_{t-1} を一つ前のフレームの前向きベクトル
+    f_{t-1} = (cos(yaw_{t-1}), sin(yaw_{t-1})) に投影した s_t を返す。
+
+    fx, fz, dx, dz などの中間列は作らず、出力と作業用の2本の配列だけで計算する。
+    入力はカメラごとにまとまっていて、各カメラ内は frame 順であること。
+    各カメラの先頭行は nan（prev_x/prev_z/prev_yaw に各カメラの直前の状態を
+    カメラの出現順で渡せば、それとの差で計算する）。
+    """
+    cam_x = np.asarray(cam_x, dtype=float)
+    cam_z = np.asarray(cam_z, dtype=float)
+    yaw = np.asarray(yaw, dtype=float)
+    n = len(cam_x)
+    starts = camera_boundaries(camera_id)
+
+    s = np.empty(n)
+    if n == 0:
+        return s
+    buf = np.empty((2, n - 1))
+    head = s[1:]
+    # s_t = dx * cos(yaw_{t-1}) + dz * sin(yaw_{t-1})
+    np.subtract(cam_x[1:], cam_x[:-1], out=head)
+    np.cos(yaw[:-1], out=buf[0])
+    head *= buf[0]
+    np.subtract(cam_z[1:], cam_z[:-1], out=buf[0])
+    np.sin(yaw[:-1], out=buf[1])
+    buf[0] *= buf[1]
+    head += buf[0]
+
+    # カメラの先頭行は別のカメラとの差になっているので置き換える
+    if prev_x is None:
+        s[starts] = np.nan
+    else:
+        prev_yaw = np.asarray(prev_yaw, dtype=float)
+        s[starts] = ((cam_x[starts] - prev_x) * np.cos(prev_yaw)
+                     + (cam_z[starts] - prev_z) * np.sin(prev_yaw))
+    return s
+
+
+def detect_backward(camera_id, frame, cam_x, cam_z, yaw, threshold=DEFAULT_THRESHOLD):
+    """
+    複数カメラ分の (camera_id, frame, cam_x, cam_z, yaw) 配列から
+    step_forward_component と moved_backward と後退イベントを返す。
+    入力は camera_id ごとにまとまり、各カメラ内は frame 昇順であること。
+    """
+    s = step_forward_component(camera_id, cam_x, cam_z, yaw)
+    moved = s < threshold   # nan は False になる
+    events = backward_events(camera_id, frame, s, moved)
+    return s, moved, events
+
+
+def _runs(camera_id, moved):
+    """後退フレームの連続区間の (先頭行, 末尾行) を、カメラの境目で切って返す"""
+    n = len(moved)
+    starts = camera_boundaries(camera_id)
+    prev_moved = np.r_[False, moved[:-1]]
+    prev_moved[starts] = False
+    next_moved = np.r_[moved[1:], False]
+    next_moved[np.r_[starts[1:], n] - 1] = False
+    return np.flatnonzero(moved & ~prev_moved), np.flatnonzero(moved & ~next_moved)
+
+
+def backward_events(camera_id, frame, step, moved):
+    """連続した後退フレームをカメラごとにまとめて BackwardEvent のリストにする"""
+    camera_id = np.asarray(camera_id)
+    frame = np.asarray(frame)
+    moved = np.asarray(moved, dtype=bool)
+    if not moved.any():
+        return []
+    run_start, run_end = _runs(camera_id, moved)
+    # reduceat は次の区間の先頭までを足すので、後退していない行は 0 / +inf にしておく
+    total = np.add.reduceat(np.where(moved, step, 0.0), run_start)
+    peak = np.minimum.reduceat(np.where(moved, step, np.inf), run_start)
+    return [
+        BackwardEvent(camera_id[a], int(frame[a]), int(frame[b]), int(b - a + 1), float(-t), float(p))
+        for a, b, t, p in zip(run_start, run_end, total, peak)
+    ]
+
+
+class StreamingBackwardDetector:
+    """
+    バッチ（複数カメラの数フレーム分、順不同）を次々に受け取り、後退を判定するクラス。
+    カメラごとに直前フレームの位置と向き、まだ終わっていない後退イベントだけを持ち越す。
+    """
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._last = {}        # camera_id -> (x, z, yaw)
+        self._open = {}        # camera_id -> 続いている BackwardEvent
+
+    def update(self, camera_id, frame, cam_x, cam_z, yaw):
+        """
+        1バッチ分を処理して (step_forward_component, moved_backward, 終わったイベント) を返す。
+        前の2つは入力と同じ並び順。
+        """
+        camera_id = np.asarray(camera_id)
+        frame = np.asarray(frame)
+        order = np.lexsort((frame, camera_id))
+        cid = camera_id[order]
+        fr = frame[order]
+        x = np.asarray(cam_x, dtype=float)[order]
+        z = np.asarray(cam_z, dtype=float)[order]
+        yw = np.asarray(yaw, dtype=float)[order]
+
+        starts = camera_boundaries(cid)
+        ends = np.r_[starts[1:], len(cid)] - 1
+        cams = cid[starts]
+        nan3 = (np.nan, np.nan, np.nan)
+        prev = np.array([self._last.get(c, nan3) for c in cams], dtype=float).reshape(-1, 3)
+        s = step_forward_component(cid, x, z, yw, prev[:, 0], prev[:, 1], prev[:, 2])
+        moved = s < self.threshold
+
+        closed = []
+        new_events = {(e.camera_id, e.start_frame): e for e in backward_events(cid, fr, s, moved)}
+        for c, a, b in zip(cams, starts, ends):
+            carried = self._open.pop(c, None)
+            first = new_events.pop((c, int(fr[a])), None) if moved[a] else None
+            if carried is not None:
+                if first is None:
+                    closed.append(carried)   # このバッチの先頭で後退が止まった
+                else:
+                    first = BackwardEvent(c, carried.start_frame, first.end_frame,
+                                          carried.n_frames + first.n_frames,
+                                          carried.backward_distance + first.backward_distance,
+                                          min(carried.peak_step, first.peak_step))
+            if first is not None:
+                new_events[(c, first.start_frame)] = first
+            # バッチの最後まで続いているイベントは次のバッチに持ち越す
+            if moved[b]:
+                last = [e for e in new_events.values() if e.camera_id == c and e.end_frame == int(fr[b])]
+                if last:
+                    self._open[c] = new_events.pop((c, last[0].start_frame))
+            self._last[c] = (x[b], z[b], yw[b])
+        closed.extend(new_events.values())
+
+        out_s = np.empty_like(s)
+        out_s[order] = s
+        out_moved = np.empty_like(moved)
+        out_moved[order] = moved
+        return out_s, out_moved, closed
+
+    def flush(self):
+        """ 続いているイベントを全部終わらせて返す（ストリームの終わりで呼ぶ） """
+        events = list(self._open.values())
+        self._open.clear()
+        return events
+
+
+# --- 使い方例 ---
+if __name__ == "__main__":
+    import pandas as pd
+
+    # 例: カメラの位置と向きのデータ（2台分）
+    df = pd.DataFrame({
+        "camera_id": [0, 0, 0, 0, 0, 1, 1, 1, 1, 1],
+        "frame":     [0, 1, 2, 3, 4, 0, 1, 2, 3, 4],
+        "cam_x":     [0.0, 0.5, 1.0, 0.7, 0.4, 0.0, 0.0, 0.0, 0.0, 0.0],
+        "cam_z":     [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.3, 0.2, 0.1, 0.4],
+        # yaw は「どっちを向いているか」（ラジアン）
+        # カメラ0は +x 方向、カメラ1は +z 方向を向いているケースで仮定
+        "yaw":       [0.0] * 5 + [np.pi / 2] * 5,
+    })
+
+    cols = [df[c].to_numpy() for c in ["camera_id", "frame", "cam_x", "cam_z", "yaw"]]
+    df["step_forward_component"], df["moved_backward"], events = detect_backward(*cols)
+    print(df)
+    for e in events:
+        print(e)
+
+    # ストリームで受け取る場合（フレームごとに全カメラ分が届く想定）
+    detector = StreamingBackwardDetector()
+    for f in range(5):
+        batch = df[df["frame"] == f]
+        _, _, closed = detector.update(*[batch[c].to_numpy() for c in
+                                         ["camera_id", "frame", "cam_x", "cam_z", "yaw"]])
+        for e in closed:
+            print("終了したイベント:", e)
+    for e in detector.flush():
+        print("終了したイベント（flush）:", e)
@@ -1,20 +1,158 @@
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
 import numpy as np
+import scipy
 from scipy.spatial import cKDTree
 
-# 例：座標配列 A（探索対象）と B（探索先）
-A = np.array([[1, 2], [3, 4], [5, 6]])
-B = np.array([[0, 0], [2, 2], [6, 7]])
+PICKLE_PROTOCOL = 5
+
+
+class KDTreeIndexCache:
+    """
+    構築済みの cKDTree をディスクに保存しておき、次回からは読み込むだけにする。
+
+    - キーは B の中身のハッシュ（と形・型・leafsize、scipy のバージョン、pickle の形式）。
+      B が変わらなければ同じ木を使い回す。pickle の中身は cKDTree の内部状態なので、
+      scipy を更新すると別のキーになり、作り直される
+    - 読み込めない（壊れている・形式が合わない）エントリは消して作り直す
+    - 木は pickle（プロトコル5）で保存し、大きな配列（点の座標・並び替えインデックス・ノード）は
+      pickle 本体から切り離して別ファイルにする。読み込み時はそれをメモリマップで渡すので、
+      全部を読み込み直したり、木を作り直したりしない
+
+    使い方：
+        cache = KDTreeIndexCache("kdtree_cache")
+        tree = cache.get(B)
+        distances, indices = query_to_memmap(tree, A, "result")
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def content_key(points, leafsize=16, chunk_bytes=64 << 20):
+        """ 点群の中身から決まるキー（大きな配列も chunk_bytes ずつハッシュする） """
+        points = np.ascontiguousarray(points)
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{points.shape}|{points.dtype.str}|{leafsize}|"
+                 f"scipy={scipy.__version__}|pickle={PICKLE_PROTOCOL}".encode())
+        flat = points.reshape(-1).view(np.uint8)
+        for i in range(0, flat.size, chunk_bytes):
+            h.update(flat[i:i + chunk_bytes])
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """ 保存済みの木を返す（無いか、読み込めなければ None。読み込めないエントリは消す） """
+        path = self._path(key)
+        meta = os.path.join(path, "tree.pkl")
+        if not os.path.exists(meta):
+            return None
+        try:
+            with open(meta, "rb") as f:
+                payload, n_buffers = pickle.load(f)
+            # 書き込みはしないが、読み込み側が書き込み可能な配列を要求しても困らないよう copy-on-write で開く
+            buffers = [np.memmap(os.path.join(path, f"buffer_{i}.bin"), dtype=np.uint8, mode="c")
+                       if os.path.getsize(os.path.join(path, f"buffer_{i}.bin")) else b""
+                       for i in range(n_buffers)]
+            tree = pickle.loads(payload, buffers=buffers)
+            if not isinstance(tree, cKDTree):
+                raise TypeError(f"cKDTree ではありません: {type(tree).__name__}")
+        except (pickle.UnpicklingError, EOFError, OSError, AttributeError, ImportError,
+                IndexError, TypeError, ValueError):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return tree
+
+    def save(self, key, tree):
+        """ 木を保存する。別のプロセスと同時に保存しても壊れないよう、一時ディレクトリから置き換える """
+        buffers = []
+        payload = pickle.dumps(tree, protocol=PICKLE_PROTOCOL, buffer_callback=buffers.append)
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            for i, buf in enumerate(buffers):
+                with open(os.path.join(tmp, f"buffer_{i}.bin"), "wb") as f:
+                    f.write(buf.raw())
+            with open(os.path.join(tmp, "tree.pkl"), "wb") as f:
+                pickle.dump((payload, len(buffers)), f, protocol=PICKLE_PROTOCOL)
+            try:
+                os.replace(tmp, self._path(key))
+            except OSError:
+                pass   # 先に別のプロセスが保存した
+        finally:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    def get(self, points, leafsize=16, key=None):
+        """
+        points に対する木を返す。キャッシュにあれば読み込み、無ければ作って保存する。
+        キーを別の方法（ファイルの更新時刻など）で決めているなら key を渡すとハッシュを省ける。
+        """
+        key = key or self.content_key(points, leafsize)
+        tree = self.load(key)
+        if tree is None:
+            tree = cKDTree(points, leafsize=leafsize)
+            self.save(key, tree)
+        return tree
+
+
+def query_to_memmap(tree, queries, out_prefix, k=1, chunk_size=1_000_000, workers=-1, **query_kwargs):
+    """
+    queries の各点の最近傍を chunk_size 点ずつ探し、結果を
+    out_prefix + "_distances.npy" / "_indices.npy" のメモリマップに書き込んでいく。
+    結果全体をメモリに持たないので、A がとても大きくても使える（queries 自体もメモリマップでよい）。
+    見つからなかった点（distance_upper_bound を指定したとき）のインデックスは tree.n になる。
+    戻り値は (distances, indices) のメモリマップ。
+    """
+    n = len(queries)
+    shape = (n,) if k == 1 else (n, k)
+    distances = np.lib.format.open_memmap(out_prefix + "_distances.npy", mode="w+", dtype=np.float64, shape=shape)
+    indices = np.lib.format.open_memmap(out_prefix + "_indices.npy", mode="w+", dtype=np.intp, shape=shape)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        d, i = tree.query(np.asarray(queries[start:stop]), k=k, workers=workers, **query_kwargs)
+        distances[start:stop] = d
+        indices[start:stop] = i
+    distances.flush()
+    indices.flush()
+    return distances, indices
+
+
+if __name__ == "__main__":
+    # 例：座標配列 A（探索対象）と B（探索先）
+    A = np.array([[1, 2], [3, 4], [5, 6]])
+    B = np.array([[0, 0], [2, 2], [6, 7]])
+
+    # B に対して KDTree を構築（1回で済む）
+    tree = cKDTree(B)
+
+    # A の各点に対して、最近傍点のインデックスと距離を取得
+    distances, indices = tree.query(A, k=1)  # k=1 → 最も近い点だけ
 
-# B に対して KDTree を構築（1回で済む）
-tree = cKDTree(B)
+    # 最近傍の座標を取得
+    nearest_points = B[indices]
 
-# A の各点に対して、最近傍点のインデックスと距離を取得
-distances, indices = tree.query(A, k=1)  # k=1 → 最も近い点だけ
+    # 結果を表示
+    print("Aの各点に対するB内の最も近い点（高速版）:")
+    for i in range(len(A)):
+        print(f"A[{i}] = {A[i]} → 最近傍 B = {nearest_points[i]} (距離 = {distances[i]:.2f})")
 
-# 最近傍の座標を取得
-nearest_points = B[indices]
+    # 大きな B を使い回す場合：2回目以降は保存した木を読み込むだけ
+    import time
 
-# 結果を表示
-print("Aの各点に対するB内の最も近い点（高速版）:")
-for i in range(len(A)):
-    print(f"A[{i}] = {A[i]} → 最近傍 B = {nearest_points[i]} (距離 = {distances[i]:.2f})")
\ No newline at end of file
+    rng = np.random.default_rng(0)
+    B_big = rng.random((2_000_000, 3))
+    A_big = rng.random((5_000_000, 3))
+    cache = KDTreeIndexCache("kdtree_cache")
+    for attempt in range(2):
+        t0 = time.perf_counter()
+        tree = cache.get(B_big)
+        print(f"{attempt + 1}回目: 木の用意 {time.perf_counter() - t0:.2f}s")
+    t0 = time.perf_counter()
+    d, i = query_to_memmap(tree, A_big, "nearest", chunk_size=500_000)
+    print(f"{len(A_big):,} 点の探索 {time.perf_counter() - t0:.2f}s → nearest_distances.npy / nearest_indices.npy")
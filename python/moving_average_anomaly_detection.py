@@ -1,22 +1,330 @@
-# 移動平均を計算
-window_size = 10  # 移動平均の窓幅
-moving_avg = widths.rolling(window=window_size).mean()
+import warnings
+from dataclasses import dataclass
 
-# 差分を計算
-diffs = np.abs(widths - moving_avg)
+import numpy as np
+import pandas as pd
 
-# しきい値を設定
-threshold_diff = np.mean(diffs) + 2 * np.std(diffs)
 
-# 異常検知
-anomalies = diffs > threshold_diff
+@dataclass
+class AnomalyEvent:
+    """連続した異常フレームの区間"""
+    start: int          # 最初の異常フレーム
+    end: int            # 最後の異常フレーム（この区間に含む）
+    peak: int           # 区間内で移動平均からの差が一番大きいフレーム
+    peak_diff: float    # そのときの差
 
-# 異常フレームを出力
-anomalous= np.where(anomalies)[0]
-print(f"異常: {anomalous}")
 
+class StreamingAnomalyDetector:
+    """
+    1サンプルずつ受け取って異常を判定するクラス（1サンプルあたり O(1)）。
 
-# 異常の連続性を確認
-anomalous_diff = np.diff(anomalous)
-continuous_anomalies = anomalous[anomalous_diff == 1]  # 連続した異常のみ
-print(f"連続した異常: {continuous_anomalies}")
\ No newline at end of file
+    - 直近 window 個の移動平均・分散をリングバッファ上の Welford 法で更新する
+    - 差 |x - 移動平均| のしきい値は、過去の差の指数移動平均 + k × 指数移動標準偏差
+      （alpha が大きいほど最近の差を重く見る）
+    - しきい値は判定するサンプル自身を含めずに決める（大きな異常でしきい値が上がらないように）
+    - 移動平均が出そろうまで（window 個）と、差が warmup 個たまるまでは判定しない
+    - nan（欠測）のサンプルは飛ばす（異常区間はそこで区切る）
+    """
+    def __init__(self, window=10, k=2.0, alpha=0.01, warmup=None):
+        self.window = window
+        self.k = k
+        self.alpha = alpha
+        self.warmup = window if warmup is None else warmup
+        self._buf = [0.0] * window
+        self._pos = 0
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._diff_mean = 0.0
+        self._diff_var = 0.0
+        self._n_diffs = 0
+        self._index = -1
+        self._open = None   # 続いている異常区間 [start, peak, peak_diff]
+
+    @property
+    def rolling_mean(self):
+        return self._mean if self._n else float("nan")
+
+    @property
+    def rolling_std(self):
+        return (self._m2 / (self._n - 1)) ** 0.5 if self._n > 1 else float("nan")
+
+    @property
+    def threshold(self):
+        if self._n_diffs < self.warmup:
+            return float("nan")
+        return self._diff_mean + self.k * self._diff_var ** 0.5
+
+    def _push(self, x):
+        """ リングバッファに x を入れ、移動平均と偏差平方和を更新する """
+        if self._n < self.window:
+            self._buf[self._pos] = x
+            self._n += 1
+            d = x - self._mean
+            self._mean += d / self._n
+            self._m2 += d * (x - self._mean)
+        else:
+            old = self._buf[self._pos]
+            self._buf[self._pos] = x
+            old_mean = self._mean
+            self._mean += (x - old) / self._n
+            # 丸め誤差で負にならないようにする（負だと rolling_std が複素数になる）
+            self._m2 = max(0.0, self._m2 + (x - old) * (x - self._mean + old - old_mean))
+        self._pos = (self._pos + 1) % self.window
+        # 差分更新の丸め誤差がたまらないよう、リングが一周したら平均と偏差平方和を取り直す
+        if self._pos == 0 and self._n == self.window:
+            self._mean = sum(self._buf) / self._n
+            self._m2 = sum((v - self._mean) ** 2 for v in self._buf)
+
+    def update(self, x):
+        """
+        1サンプル処理して (異常か, 差, 終わった AnomalyEvent または None) を返す。
+        差は移動平均がまだ出ていなければ nan。
+        x が nan（欠測）のサンプルは判定せず、リングバッファにもしきい値の統計にも入れない
+        （nan が入るとしきい値がずっと nan になり、以後何も検知できなくなるため）。
+        """
+        x = float(x)
+        self._index += 1
+        if x != x:
+            return False, float("nan"), self._close()
+        self._push(x)
+        if self._n < self.window:
+            return False, float("nan"), self._close()
+
+        diff = abs(x - self._mean)
+        is_anomaly = self._n_diffs >= self.warmup and diff > self.threshold
+
+        # しきい値用の指数移動平均・分散を更新
+        self._n_diffs += 1
+        if self._n_diffs == 1:
+            self._diff_mean = diff
+        else:
+            delta = diff - self._diff_mean
+            self._diff_mean += self.alpha * delta
+            self._diff_var = (1.0 - self.alpha) * (self._diff_var + self.alpha * delta * delta)
+
+        if not is_anomaly:
+            return False, diff, self._close()
+        if self._open is None:
+            self._open = [self._index, self._index, diff]
+        elif diff > self._open[2]:
+            self._open[1:] = [self._index, diff]
+        return True, diff, None
+
+    def _close(self):
+        if self._open is None:
+            return None
+        start, peak, peak_diff = self._open
+        self._open = None
+        return AnomalyEvent(start, self._index - 1, peak, peak_diff)
+
+    def flush(self):
+        """ 続いている異常区間を終わらせて返す（ストリームの終わりで呼ぶ） """
+        if self._open is None:
+            return None
+        start, peak, peak_diff = self._open
+        self._open = None
+        return AnomalyEvent(start, self._index, peak, peak_diff)
+
+
+def detect_anomalies(values, window=10, k=2.0, alpha=0.01, warmup=None):
+    """
+    配列をまとめて処理するバッチ版。StreamingAnomalyDetector に順に流したのと同じ結果になる。
+    戻り値は (異常マスク, 差, AnomalyEvent のリスト)。
+    """
+    detector = StreamingAnomalyDetector(window, k, alpha, warmup)
+    values = np.asarray(values, dtype=float)
+    mask = np.zeros(len(values), dtype=bool)
+    diffs = np.empty(len(values))
+    events = []
+    update = detector.update
+    for i, x in enumerate(values.tolist()):
+        mask[i], diffs[i], event = update(x)
+        if event is not None:
+            events.append(event)
+    last = detector.flush()
+    if last is not None:
+        events.append(last)
+    return mask, diffs, events
+
+
+def consecutive_runs(indices, min_length=2):
+    """
+    異常フレームの番号の列から、min_length 個以上連続している区間を (先頭, 末尾) で返す。
+    （np.diff(...) == 1 で拾うと各区間の最後のフレームが落ちるので、区間の両端を求める）
+    """
+    indices = np.asarray(indices)
+    if len(indices) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) != 1)
+    starts = np.r_[0, breaks + 1]
+    ends = np.r_[breaks, len(indices) - 1]
+    return [(int(indices[s]), int(indices[e])) for s, e in zip(starts, ends) if e - s + 1 >= min_length]
+
+
+# --- 複数系列（[n_series, T]）をまとめて処理する版 ---
+MAD_SCALE = 1.4826   # 正規分布のとき MAD × これ が標準偏差になる
+
+
+def rolling_mean_2d(values, window):
+    """
+    各行（系列）の移動平均を、時間方向の累積和の差で求める（pandas の rolling().mean() と同じ位置合わせ）。
+    最初の window - 1 列と、窓の中に nan がある列は nan（pandas と同じ）。
+    nan は 0 にしてから累積し、有効なサンプル数の累積を別に持つ（nan が後ろの列に広がらない）。
+    累積和の桁落ちを抑えるため、各行の最初の有効な値を引いてから足す。
+    """
+    values = np.asarray(values, dtype=float)
+    n, T = values.shape
+    if window == 1:
+        return values.copy()
+    out = np.full((n, T), np.nan)
+    if T < window:
+        return out
+    valid = ~np.isnan(values)
+    first = valid.argmax(axis=1)
+    offset = np.where(valid[np.arange(n), first], values[np.arange(n), first], 0.0)[:, None]
+    cum = np.zeros((n, T + 1))
+    np.cumsum(np.where(valid, values - offset, 0.0), axis=1, out=cum[:, 1:])
+    count = np.zeros((n, T + 1), dtype=np.intp)
+    np.cumsum(valid, axis=1, out=count[:, 1:])
+    mean = (cum[:, window:] - cum[:, :-window]) / window + offset
+    out[:, window - 1:] = np.where(count[:, window:] - count[:, :-window] == window, mean, np.nan)
+    return out
+
+
+def rolling_median_mad_2d(values, window, chunk_rows=256):
+    """
+    各行の移動中央値と移動 MAD（中央値からの絶対偏差の中央値）を返す。
+    窓ごとに1回だけ並べ替え、その並びから中央値と MAD の両方を取り出す。
+    並べ替えた窓は (行数, T, window) になるので、chunk_rows 行ずつ処理してメモリを抑える。
+    窓の中に nan がある列は nan（np.sort は nan を末尾に置くので、そのままだと中央値がずれる）。
+    """
+    values = np.asarray(values, dtype=float)
+    n, T = values.shape
+    median = np.full((n, T), np.nan)
+    mad = np.full((n, T), np.nan)
+    if T < window:
+        return median, mad
+    lo, hi = (window - 1) // 2, window // 2
+    n_nan = np.zeros((n, T + 1), dtype=np.intp)
+    np.cumsum(np.isnan(values), axis=1, out=n_nan[:, 1:])
+    has_nan = n_nan[:, window:] - n_nan[:, :-window] > 0
+    for r0 in range(0, n, chunk_rows):
+        block = np.lib.stride_tricks.sliding_window_view(values[r0:r0 + chunk_rows], window, axis=1)
+        ordered = np.sort(block, axis=-1)
+        med = 0.5 * (ordered[..., lo] + ordered[..., hi])
+        dev = np.abs(ordered - med[..., None])
+        dev.partition((lo, hi), axis=-1)
+        median[r0:r0 + chunk_rows, window - 1:] = med
+        mad[r0:r0 + chunk_rows, window - 1:] = 0.5 * (dev[..., lo] + dev[..., hi])
+    median[:, window - 1:][has_nan] = np.nan
+    mad[:, window - 1:][has_nan] = np.nan
+    return median, mad
+
+
+@dataclass
+class AnomalyResult2D:
+    """複数系列の異常判定の結果"""
+    center: np.ndarray      # [n_series, T] 移動平均（robust=True なら移動中央値）
+    diffs: np.ndarray       # [n_series, T] |値 - center|
+    threshold: np.ndarray   # [n_series, 1]（robust=True なら [n_series, T]）
+    mask: np.ndarray        # [n_series, T] 異常なら True
+
+
+def detect_anomalies_2d(values, window=10, k=2.0, robust=False):
+    """
+    [n_series, T] の配列の全系列を一度に判定する。
+    robust=False: 元の方法と同じく、系列ごとに 差の平均 + k × 差の標準偏差 をしきい値にする
+    robust=True : 移動中央値からの差が k × 1.4826 × 移動 MAD を超えたら異常（外れ値に引っ張られにくい）
+    """
+    values = np.asarray(values, dtype=float)
+    if robust:
+        center, mad = rolling_median_mad_2d(values, window)
+        threshold = k * MAD_SCALE * mad
+    else:
+        center = rolling_mean_2d(values, window)
+    diffs = np.abs(values - center)
+    if not robust:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)   # T < window の行は全部 nan
+            threshold = (np.nanmean(diffs, axis=1) + k * np.nanstd(diffs, axis=1))[:, None]
+    with np.errstate(invalid="ignore"):
+        mask = diffs > threshold   # nan の位置は False
+    return AnomalyResult2D(center, diffs, threshold, mask)
+
+
+def anomaly_events_2d(mask, diffs=None):
+    """
+    異常マスク [n_series, T] の連続区間を全系列まとめて取り出す。
+    戻り値は (系列番号, 先頭, 末尾, ピーク) の配列のタプル（系列順・時間順）。
+    diffs を渡さなければピークは先頭と同じ。
+    """
+    mask = np.asarray(mask, dtype=bool)
+    n, T = mask.shape
+    edges = np.diff(np.pad(mask.view(np.int8), ((0, 0), (1, 1))), axis=1)
+    series, start = np.nonzero(edges == 1)
+    _, end = np.nonzero(edges == -1)
+    end = end - 1
+    if diffs is None or len(start) == 0:
+        return series, start, end, start.copy()
+
+    # 区間ごとの最大値の位置：異常でないところを -inf にして、区間の先頭から次の区間の先頭までで集計
+    flat = np.where(mask, diffs, -np.inf).ravel()
+    seg_start = series * T + start
+    tail = flat[seg_start[0]:]
+    rel = seg_start - seg_start[0]
+    peak_value = np.maximum.reduceat(tail, rel)
+    counts = np.diff(np.r_[rel, tail.size])
+    hit = tail == np.repeat(peak_value, counts)
+    first = np.minimum.reduceat(np.where(hit, np.arange(tail.size), tail.size), rel) + seg_start[0]
+    return series, start, end, first - series * T
+
+
+if __name__ == "__main__":
+    # 例: 幅の時系列（ところどころに異常を入れる）
+    rng = np.random.default_rng(0)
+    widths = pd.Series(10 + rng.normal(0, 0.2, 500))
+    widths[120:124] += 3
+    widths[300] -= 2
+
+    # 移動平均を計算
+    window_size = 10  # 移動平均の窓幅
+    moving_avg = widths.rolling(window=window_size).mean()
+
+    # 差分を計算
+    diffs = np.abs(widths - moving_avg)
+
+    # しきい値を設定
+    threshold_diff = np.mean(diffs) + 2 * np.std(diffs)
+
+    # 異常検知
+    anomalies = diffs > threshold_diff
+
+    # 異常フレームを出力
+    anomalous = np.where(anomalies)[0]
+    print(f"異常: {anomalous}")
+
+    # 異常の連続性を確認（区間の最後のフレームも含める）
+    print(f"連続した異常: {consecutive_runs(anomalous)}")
+
+    # ストリーム版（1サンプルずつ）
+    detector = StreamingAnomalyDetector(window=window_size, k=4.0, alpha=0.02)
+    for x in widths:
+        _, _, event = detector.update(x)
+        if event is not None:
+            print("異常区間:", event)
+    if (event := detector.flush()) is not None:
+        print("異常区間:", event)
+
+    # バッチ版（同じ結果になる）
+    mask, _, events = detect_anomalies(widths.to_numpy(), window=window_size, k=4.0, alpha=0.02)
+    print(f"バッチ版の異常区間: {[(e.start, e.end, e.peak) for e in events]}")
+
+    # 5000 系列をまとめて
+    lines = 10 + rng.normal(0, 0.2, (5000, 1000))
+    lines[42, 500:505] += 3
+    result = detect_anomalies_2d(lines, window=window_size, k=4.0)
+    series, start, end, peak = anomaly_events_2d(result.mask, result.diffs)
+    print(f"異常区間の数: {len(start)}, 系列42: {[(int(s), int(e)) for i, s, e in zip(series, start, end) if i == 42]}")
+    robust = detect_anomalies_2d(lines, window=window_size + 1, k=6.0, robust=True)
+    print(f"中央値/MAD 版の異常フレーム数: {robust.mask.sum()}")
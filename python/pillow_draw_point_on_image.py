@@ -1,22 +1,118 @@
-from PIL import Image, ImageDraw
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-# 画像を読み込み
-image = Image.open('example.jpg')  # 既存の画像ファイル名を指定
-draw = ImageDraw.Draw(image)
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw
 
-# 点の座標を指定
-point = (100, 150)  # (x, y) 座標
-radius = 3  # 点の半径
 
-# 点を描画（赤い円として描画）
-draw.ellipse(
-    (point[0] - radius, point[1] - radius, point[0] + radius, point[1] + radius),
-    fill="red",
-    outline="red"
-)
+@lru_cache(maxsize=32)
+def disc_offsets(radius):
+    """
+    半径 radius の円（draw.ellipse と同じ形）を1回だけ描いて、
+    中心からの相対位置 (dy, dx) の配列にする。
+    """
+    size = 2 * radius + 1
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, 2 * radius, 2 * radius), fill=255, outline=255)
+    dy, dx = np.nonzero(np.array(mask))
+    return dy - radius, dx - radius
 
-# 画像を保存
-image.save('image_with_point.jpg')  # 新しいファイル名を指定して保存
 
-# 画像を表示
-image.show()
\ No newline at end of file
+_MODE_BY_CHANNELS = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+
+def _color_values(color, mode, n_channels):
+    """
+    色の指定を、画像のモードの (色の数, チャンネル数) の配列にする。
+    名前・数値・タプル・リストは1色、2次元の配列 (N, チャンネル数) のときだけ点ごとの色として扱う。
+    1色は 1x1 の画像に ImageDraw で描いて読み取る（draw.ellipse と同じ解釈になる）。
+    チャンネル数が画像と違う色（L の画像に (R, G, B) など）は Pillow の変換で合わせる。
+    """
+    if isinstance(color, str):
+        color = ImageColor.getcolor(color, mode)
+    colors = np.asarray(color, dtype=np.uint8)
+    if colors.ndim < 2:
+        probe = Image.new(mode, (1, 1))
+        try:
+            ImageDraw.Draw(probe).point((0, 0), fill=tuple(colors.tolist()) if colors.ndim else int(colors))
+            return np.array(probe).reshape(1, n_channels)
+        except (TypeError, ValueError):
+            colors = colors.reshape(1, -1)   # ImageDraw が受け付けない組み合わせは下の変換で合わせる
+    if colors.shape[1] != n_channels:
+        row = colors[None, :, 0] if colors.shape[1] == 1 else colors[None]
+        converted = Image.fromarray(row, _MODE_BY_CHANNELS[colors.shape[1]]).convert(mode)
+        colors = np.array(converted).reshape(-1, n_channels)
+    return colors
+
+
+def draw_points(image, points, radius=3, color="red"):
+    """
+    points (N, 2) の (x, y) 座標すべてに、半径 radius の点を打った画像を返す。
+    点の形は1回だけ作り、全点分の画素位置をまとめて計算して一度に書き込む。
+    画像の外にはみ出した部分は切り捨てる。点が重なる場合は後の点の色になる。
+
+    color: 色名・数値・(R, G, B) のタプルやリストで全点同じ色、(N, チャンネル数) の2次元配列で点ごとの色
+    """
+    if image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGB")
+    arr = np.array(image)
+    h, w = arr.shape[:2]
+    n_channels = 1 if arr.ndim == 2 else arr.shape[2]
+    colors = _color_values(color, image.mode, n_channels)
+
+    pts = np.rint(np.asarray(points, dtype=float).reshape(-1, 2)).astype(np.intp)
+    dy, dx = disc_offsets(radius)
+    ys = (pts[:, 1, None] + dy).ravel()
+    xs = (pts[:, 0, None] + dx).ravel()
+    inside = (ys >= 0) & (ys < h) & (xs >= 0) & (xs < w)
+
+    flat = (ys * w + xs)[inside]
+    if len(colors) == 1:
+        # 全点同じ色：塗る画素の印を付けてから一度に塗る（重なりを何度も書かない）
+        mask = np.zeros(h * w, dtype=bool)
+        mask[flat] = True
+        arr.reshape(h * w, n_channels)[mask] = colors[0]
+    else:
+        values = np.repeat(colors, len(dy), axis=0)[inside]
+        arr.reshape(h * w, n_channels)[flat] = values
+    return Image.fromarray(arr)
+
+
+def _stamp_file(task):
+    src, dst, points, radius, color = task
+    with Image.open(src) as image:
+        draw_points(image, points, radius, color).save(dst)
+    return dst
+
+
+def draw_points_batch(paths, points_for, out_dir, radius=3, color="red", max_workers=None):
+    """
+    画像の列に点を打って out_dir に保存する（表示はしない）。
+    読み込み・描画・保存をスレッドプールで並行に行う（Pillow のデコード/エンコードは GIL を離す）。
+    points_for(path) でその画像の点 (N, 2) を返す関数か、path -> 点 の dict を渡す。
+    戻り値は保存したパスのリスト（入力と同じ順）。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    lookup = points_for.__getitem__ if isinstance(points_for, dict) else points_for
+    tasks = [(p, os.path.join(out_dir, os.path.basename(p)), lookup(p), radius, color) for p in paths]
+    with ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(_stamp_file, tasks))
+
+
+if __name__ == "__main__":
+    # 画像を読み込み
+    image = Image.open('example.jpg')  # 既存の画像ファイル名を指定
+
+    # 点の座標を指定
+    point = (100, 150)  # (x, y) 座標
+    radius = 3  # 点の半径
+
+    # 点を描画（赤い円として描画）
+    image = draw_points(image, [point], radius, "red")
+
+    # 画像を保存
+    image.save('image_with_point.jpg')  # 新しいファイル名を指定して保存
+
+    # 画像を表示
+    image.show()
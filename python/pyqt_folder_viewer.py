@@ -1,14 +1,242 @@
 import sys
 import os
+import hashlib
+import threading
+from collections import OrderedDict
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QHBoxLayout, QVBoxLayout,
-    QPushButton, QTableView, QListWidget,
+    QPushButton, QTableView, QListView,
     QFileDialog, QMessageBox
 )
-from PyQt5.QtCore import QStringListModel, Qt
+from PyQt5.QtCore import (
+    QStringListModel, Qt, QAbstractListModel, QModelIndex,
+    QObject, QRunnable, QThreadPool, QThread, QFileSystemWatcher, QTimer,
+    QStandardPaths, QSize, QPoint, pyqtSignal
+)
+from PyQt5.QtGui import QIcon, QImage, QImageReader, QPixmap
 
 
 SAVE_FILE = "folder_paths.txt"  # フォルダパス保存用ファイル
+SCAN_BATCH_SIZE = 2000          # ワーカーからまとめて送るファイル名の数
+WATCH_DEBOUNCE_MS = 300         # フォルダ変更通知をまとめる待ち時間
+THUMBNAIL_SIZE = 128            # サムネイルの一辺（px）
+THUMBNAIL_MEMORY_ITEMS = 3000   # メモリ上に持っておくサムネイルの数
+THUMBNAIL_PREFETCH_ROWS = 60    # 画面の下に続く、先に作っておく件数
+
+
+def thumbnail_cache_dir():
+    """
+    サムネイルのディスクキャッシュの置き場所。
+    ユーザーのキャッシュディレクトリが取れなければ folder_paths.txt の隣に作る。
+    """
+    base = QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    if not base:
+        base = os.path.dirname(os.path.abspath(SAVE_FILE))
+    path = os.path.join(base, "folder_viewer_thumbnails")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def thumbnail_cache_path(cache_dir, path, st):
+    """ (パス, 更新時刻, サイズ) をキーにしたキャッシュファイルのパス """
+    key = f"{os.path.abspath(path)}\0{st.st_mtime_ns}\0{st.st_size}\0{THUMBNAIL_SIZE}"
+    digest = hashlib.sha1(key.encode("utf-8", "surrogateescape")).hexdigest()
+    # 1つのディレクトリにファイルが溜まりすぎないよう先頭2文字で分ける
+    return os.path.join(cache_dir, digest[:2], digest + ".png")
+
+
+class FileListModel(QAbstractListModel):
+    """
+    ファイル名の一覧を持つモデル。
+    addItem を1件ずつ呼ぶのではなく、バッチ単位で行を追加・削除する。
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._names = []
+        self._name_set = set()
+        self._icons = OrderedDict()    # ファイル名 -> QIcon（サムネイル、LRU）
+        self.show_thumbnails = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self._names[index.row()]
+        if role == Qt.DecorationRole and self.show_thumbnails:
+            # ここではファイルを読まない（無ければ空のまま。作るのはワーカー）
+            return self._icons.get(self._names[index.row()])
+        return None
+
+    def names(self):
+        return self._name_set
+
+    def name_at(self, row):
+        return self._names[row]
+
+    def has_icon(self, name):
+        return name in self._icons
+
+    def set_show_thumbnails(self, enabled):
+        self.show_thumbnails = enabled
+        if self._names:
+            self.dataChanged.emit(self.index(0), self.index(len(self._names) - 1),
+                                  [Qt.DecorationRole])
+
+    def set_icon(self, name, icon, row_hint):
+        if name not in self._name_set:
+            return
+        self._icons[name] = icon
+        self._icons.move_to_end(name)
+        while len(self._icons) > THUMBNAIL_MEMORY_ITEMS:
+            self._icons.popitem(last=False)
+        # 行番号は依頼した時点のもの。ずれていたら探し直す
+        row = row_hint
+        if not (0 <= row < len(self._names) and self._names[row] == name):
+            row = self._names.index(name)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def clear(self):
+        self.beginResetModel()
+        self._names = []
+        self._name_set = set()
+        self._icons.clear()
+        self.endResetModel()
+
+    def append_names(self, names):
+        names = [n for n in names if n not in self._name_set]
+        if not names:
+            return
+        first = len(self._names)
+        self.beginInsertRows(QModelIndex(), first, first + len(names) - 1)
+        self._names.extend(names)
+        self._name_set.update(names)
+        self.endInsertRows()
+
+    def remove_names(self, names):
+        names = set(names) & self._name_set
+        if not names:
+            return
+        rows = [i for i, n in enumerate(self._names) if n in names]
+        self._name_set -= names
+        if len(rows) > 1000:
+            # 大量に消えたときは行ごとに通知するより作り直した方が速い
+            self.beginResetModel()
+            self._names = [n for n in self._names if n not in names]
+            self.endResetModel()
+            return
+        # 後ろの行から消せば、前の行番号はずれない
+        for row in reversed(rows):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._names[row]
+            self.endRemoveRows()
+
+
+class ScanSignals(QObject):
+    """ QRunnable はシグナルを持てないので、別の QObject に持たせる """
+    batch = pyqtSignal(int, list)      # (世代番号, ファイル名のリスト)
+    finished = pyqtSignal(int)
+    error = pyqtSignal(int, str)
+
+
+class ScanWorker(QRunnable):
+    """
+    os.scandir でフォルダを走査し、ファイル名をバッチでGUIスレッドへ送るワーカー。
+    entry.is_file() はディレクトリエントリの種別を使うので、ほとんどの環境で stat しない。
+    """
+    def __init__(self, folder_path, generation):
+        super().__init__()
+        self.folder_path = folder_path
+        self.generation = generation
+        self.signals = ScanSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def run(self):
+        batch = []
+        try:
+            with os.scandir(self.folder_path) as it:
+                for entry in it:
+                    if self._cancelled.is_set():
+                        return
+                    if entry.is_file():
+                        batch.append(entry.name)
+                        if len(batch) >= SCAN_BATCH_SIZE:
+                            self.signals.batch.emit(self.generation, batch)
+                            batch = []
+            if batch:
+                self.signals.batch.emit(self.generation, batch)
+            self.signals.finished.emit(self.generation)
+        except OSError as e:
+            self.signals.error.emit(self.generation, str(e))
+
+
+class ThumbnailSignals(QObject):
+    done = pyqtSignal(int, str, int, QImage)   # (世代番号, ファイル名, 行, サムネイル)
+
+
+class ThumbnailWorker(QRunnable):
+    """
+    1枚分のサムネイルを作るワーカー。
+    ディスクキャッシュにあればそれを読み、無ければ縮小読み込みしてキャッシュに書く。
+    QPixmap はGUIスレッドでしか使えないので、ここでは QImage までを作る。
+    """
+    def __init__(self, folder_path, name, row, generation, cache_dir):
+        super().__init__()
+        self.folder_path = folder_path
+        self.name = name
+        self.row = row
+        self.generation = generation
+        self.cache_dir = cache_dir
+        self.started = False
+        self.signals = ThumbnailSignals()
+
+    def run(self):
+        self.started = True
+        path = os.path.join(self.folder_path, self.name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        cache_path = thumbnail_cache_path(self.cache_dir, path, st)
+        image = QImage(cache_path) if os.path.exists(cache_path) else QImage()
+        if image.isNull():
+            image = self.make_thumbnail(path)
+            if image.isNull():
+                return
+            self.save_to_cache(image, cache_path)
+        self.signals.done.emit(self.generation, self.name, self.row, image)
+
+    @staticmethod
+    def make_thumbnail(path):
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            # JPEGなどはデコード時に縮小されるので、元のサイズで展開しない
+            size.scale(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.KeepAspectRatio)
+            reader.setScaledSize(size)
+        image = reader.read()
+        if not image.isNull() and max(image.width(), image.height()) > THUMBNAIL_SIZE:
+            image = image.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+                                 Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        return image
+
+    @staticmethod
+    def save_to_cache(image, cache_path):
+        # 書きかけのファイルを他のスレッドやプロセスに読ませないよう、一時ファイルから置き換える
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if image.save(tmp_path, "PNG"):
+                os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # キャッシュに書けなくても表示はできる
 
 
 class FolderViewer(QWidget):
@@ -27,8 +255,46 @@ class FolderViewer(QWidget):
         self.folder_table.setEditTriggers(QTableView.NoEditTriggers)
         self.folder_table.clicked.connect(self.on_folder_selected)
 
-        # --- 右側：ファイル一覧 ---
-        self.file_list = QListWidget()
+        # --- 右側：ファイル一覧（モデル＋ビュー。行の高さは全部同じなので計算を省く） ---
+        self.file_model = FileListModel(self)
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_model)
+        self.file_list.setUniformItemSizes(True)
+        self.file_list.setEditTriggers(QListView.NoEditTriggers)
+
+        # --- ファイル一覧の非同期読み込みとフォルダ監視 ---
+        self.thread_pool = QThreadPool(self)
+        self.scan_worker = None        # 実行中の走査
+        self.scan_generation = 0       # 古い走査の結果を捨てるための世代番号
+        self.scan_is_refresh = False   # 変更通知による再走査かどうか
+        self.refresh_names = set()     # 再走査で見つかったファイル名
+        self.current_folder = None
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(WATCH_DEBOUNCE_MS)
+        self.watch_timer.timeout.connect(self.refresh_current_folder)
+
+        # --- サムネイル表示（見えている分から順に、上限付きのスレッドプールで作る） ---
+        self.thumb_button = QPushButton("サムネイル表示")
+        self.thumb_button.setCheckable(True)
+        self.thumb_button.toggled.connect(self.set_thumbnail_mode)
+        self.thumb_pool = QThreadPool(self)
+        self.thumb_pool.setMaxThreadCount(max(1, min(4, QThread.idealThreadCount() - 1)))
+        self.thumb_cache_dir = thumbnail_cache_dir()
+        self.thumb_generation = 0      # フォルダを切り替えたら古い結果を捨てる
+        self.thumb_pending = {}        # ファイル名 -> 依頼済みのワーカー
+        self.image_suffixes = {
+            bytes(fmt).decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()
+        }
+        self.thumb_timer = QTimer(self)
+        self.thumb_timer.setSingleShot(True)
+        self.thumb_timer.setInterval(30)
+        self.thumb_timer.timeout.connect(self.request_visible_thumbnails)
+        self.file_list.verticalScrollBar().valueChanged.connect(self.schedule_thumbnails)
+        self.file_model.rowsInserted.connect(self.schedule_thumbnails)
+        self.file_model.modelReset.connect(self.schedule_thumbnails)
 
         # --- 下部：フォルダ追加用ボタン ---
         self.add_button = QPushButton("フォルダを追加")
@@ -39,9 +305,14 @@ class FolderViewer(QWidget):
         left_layout.addWidget(self.folder_table)
         left_layout.addWidget(self.add_button)
 
+        # --- 右側まとめレイアウト ---
+        right_layout = QVBoxLayout()
+        right_layout.addWidget(self.thumb_button)
+        right_layout.addWidget(self.file_list)
+
         # --- メインレイアウトに追加 ---
         main_layout.addLayout(left_layout, 2)
-        main_layout.addWidget(self.file_list, 3)
+        main_layout.addLayout(right_layout, 3)
 
         # 起動時にファイルから復元
         self.load_paths_from_file()
@@ -69,14 +340,147 @@ class FolderViewer(QWidget):
         self.show_files_in_folder(path)
 
     def show_files_in_folder(self, folder_path):
-        self.file_list.clear()
-        try:
-            for name in os.listdir(folder_path):
-                full_path = os.path.join(folder_path, name)
-                if os.path.isfile(full_path):
-                    self.file_list.addItem(name)
-        except Exception as e:
-            QMessageBox.critical(self, "エラー", f"フォルダの読み込み中にエラーが発生しました:\n{e}")
+        # 監視対象を切り替えて、一覧を空にしてから走査を始める
+        if self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        self.watch_timer.stop()
+        self.current_folder = folder_path
+        self.reset_thumbnail_requests()
+        self.file_model.clear()
+        self.start_scan(folder_path, refresh=False)
+        self.watcher.addPath(folder_path)
+
+    def start_scan(self, folder_path, refresh):
+        # 前の走査は取り消す（届いてしまった結果も世代番号で捨てる）
+        if self.scan_worker is not None:
+            self.scan_worker.cancel()
+        self.scan_generation += 1
+        self.scan_is_refresh = refresh
+        self.refresh_names = set()
+
+        worker = ScanWorker(folder_path, self.scan_generation)
+        worker.signals.batch.connect(self.on_scan_batch)
+        worker.signals.finished.connect(self.on_scan_finished)
+        worker.signals.error.connect(self.on_scan_error)
+        self.scan_worker = worker
+        self.thread_pool.start(worker)
+
+    def on_scan_batch(self, generation, names):
+        if generation != self.scan_generation:
+            return
+        if self.scan_is_refresh:
+            # 再走査では一覧を作り直さず、差分だけを反映する
+            self.refresh_names.update(names)
+        self.file_model.append_names(names)
+
+    def on_scan_finished(self, generation):
+        if generation != self.scan_generation:
+            return
+        self.scan_worker = None
+        if self.scan_is_refresh:
+            removed = self.file_model.names() - self.refresh_names
+            self.file_model.remove_names(removed)
+            self.refresh_names = set()
+
+    def on_scan_error(self, generation, message):
+        if generation != self.scan_generation:
+            return
+        self.scan_worker = None
+        QMessageBox.critical(self, "エラー", f"フォルダの読み込み中にエラーが発生しました:\n{message}")
+
+    def on_directory_changed(self, path):
+        # 変更通知は連続して来るので、少し待ってからまとめて反映する
+        if path == self.current_folder:
+            self.watch_timer.start()
+
+    def refresh_current_folder(self):
+        if self.current_folder is None:
+            return
+        if not os.path.isdir(self.current_folder):
+            self.file_model.clear()
+            return
+        self.start_scan(self.current_folder, refresh=True)
+        # 削除→再作成されたフォルダは監視が外れるので付け直す
+        if self.current_folder not in self.watcher.directories():
+            self.watcher.addPath(self.current_folder)
+
+    def set_thumbnail_mode(self, enabled):
+        view = self.file_list
+        if enabled:
+            view.setViewMode(QListView.IconMode)
+            view.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            view.setGridSize(QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 36))
+            view.setResizeMode(QListView.Adjust)
+            view.setMovement(QListView.Static)
+        else:
+            view.setViewMode(QListView.ListMode)
+            view.setIconSize(QSize())
+            view.setGridSize(QSize())
+            self.reset_thumbnail_requests()
+        self.file_model.set_show_thumbnails(enabled)
+        self.schedule_thumbnails()
+
+    def reset_thumbnail_requests(self):
+        self.thumb_generation += 1
+        self.thumb_pool.clear()
+        self.thumb_pending = {}
+
+    def schedule_thumbnails(self, *args):
+        # スクロール中に何度も呼ばれるので、少しまとめてから依頼する
+        if self.file_model.show_thumbnails:
+            self.thumb_timer.start()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_thumbnails()
+
+    def visible_rows(self):
+        """ 画面に見えている行と、その下に続く何行かを上から順に返す """
+        view = self.file_list
+        rect = view.viewport().rect()
+        count = self.file_model.rowCount()
+        # IconMode では左上がグリッドの隙間になることがあるので、少し内側を調べる
+        first = view.indexAt(rect.topLeft() + QPoint(THUMBNAIL_SIZE // 2, THUMBNAIL_SIZE // 2))
+        if not first.isValid():
+            first = view.indexAt(rect.topLeft())
+        row = first.row() if first.isValid() else 0
+        rows = []
+        while row < count:
+            item_rect = view.visualRect(self.file_model.index(row))
+            if item_rect.top() > rect.bottom():
+                break
+            if item_rect.intersects(rect):
+                rows.append(row)
+            row += 1
+        return rows + list(range(row, min(count, row + THUMBNAIL_PREFETCH_ROWS)))
+
+    def request_visible_thumbnails(self):
+        if not self.file_model.show_thumbnails or self.current_folder is None:
+            return
+        # 見えなくなった分の待ち行列は捨てる（実行中のものはそのまま）
+        self.thumb_pool.clear()
+        self.thumb_pending = {
+            name: worker for name, worker in self.thumb_pending.items() if worker.started
+        }
+        rows = self.visible_rows()
+        for i, row in enumerate(rows):
+            name = self.file_model.name_at(row)
+            if name in self.thumb_pending or self.file_model.has_icon(name):
+                continue
+            if os.path.splitext(name)[1][1:].lower() not in self.image_suffixes:
+                continue
+            worker = ThumbnailWorker(self.current_folder, name, row,
+                                     self.thumb_generation, self.thumb_cache_dir)
+            worker.signals.done.connect(self.on_thumbnail_done)
+            self.thumb_pending[name] = worker
+            # 上の行ほど優先度を高くする
+            self.thumb_pool.start(worker, len(rows) - i)
+
+    def on_thumbnail_done(self, generation, name, row, image):
+        if generation != self.thumb_generation:
+            return
+        self.thumb_pending.pop(name, None)
+        self.file_model.set_icon(name, QIcon(QPixmap.fromImage(image)), row)
 
     def save_paths_to_file(self, paths):
         try:
@@ -99,6 +503,7 @@ class FolderViewer(QWidget):
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    app.setApplicationName("folder_viewer")  # サムネイルキャッシュの置き場所に使われる
     viewer = FolderViewer()
     viewer.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -1,23 +1,291 @@
+import os
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+
 import numpy as np, pandas as pd
-np.random.seed(42)
-
-# 仮定: A, B は月ごと ±15%／-5% を交互に出す
-T = 120  # 月数10年
-ret_a = np.where(np.arange(T) % 2 == 0, 1.15, 0.95)
-ret_b = np.where(np.arange(T) % 2 == 1, 1.15, 0.95)
-
-cap_a = cap_b = cap_pf = 1.0
-pf = []
-
-for ra, rb in zip(ret_a, ret_b):
-    # 毎月50:50でリバランス
-    w1, w2 = 0.5, 0.5
-    cap_a *= ra
-    cap_b *= rb
-    total = cap_a + cap_b
-    cap_a, cap_b = total * w1, total * w2   # 再均等化
-    pf.append(total)
-
-print("単体A累積:", cap_a)
-print("単体B累積:", cap_b)
-print("ポート累積:", pf[-1])        # > 1.0 になる
\ No newline at end of file
+
+
+# --- モンテカルロ版 ---
+# リターンは「グロスリターン（1 + r）」の配列 [パス, 月, 資産] で扱う。
+# 毎月のループは書かず、cumprod と「リバランス日で区切った区間ごとの積」で計算する。
+
+def generate_returns(n_paths, T, n_assets, mu=0.005, sigma=0.05, rho=0.0, seed=None):
+    """
+    対数リターンが多変量正規分布（資産間の相関は一律 rho）に従うとして、
+    グロスリターン [n_paths, T, n_assets] を作る。
+    """
+    rng = np.random.default_rng(seed)
+    cov = np.full((n_assets, n_assets), rho * sigma * sigma)
+    np.fill_diagonal(cov, sigma * sigma)
+    chol = np.linalg.cholesky(cov)
+    z = rng.standard_normal((n_paths, T, n_assets))
+    log_r = z @ chol.T
+    log_r += mu - 0.5 * sigma * sigma   # 期待グロスリターンが exp(mu) になるように
+    return np.exp(log_r, out=log_r)
+
+
+def buy_and_hold_wealth(gross, weights):
+    """ 最初に weights で買って放置したときの資産推移 [n_paths, T] """
+    return np.cumprod(gross, axis=1) @ np.asarray(weights, dtype=float)
+
+
+def rebalanced_wealth(gross, weights, every):
+    """
+    every か月ごとに weights に戻すときの、各リバランス日（区間の終わり）の資産 [n_paths, 区間数]。
+    区間内はバイ・アンド・ホールドなので、区間の伸び = Σ_i w_i × Π_{区間内} gross_i。
+    """
+    T = gross.shape[1]
+    starts = np.arange(0, T, every)
+    seg = np.multiply.reduceat(gross, starts, axis=1)      # [n_paths, 区間数, n_assets]
+    return np.cumprod(seg @ np.asarray(weights, dtype=float), axis=1)
+
+
+@dataclass
+class BonusResult:
+    """ 最終資産の分布とリバランスボーナス（リバランス ÷ バイ・アンド・ホールド − 1） """
+    buy_and_hold: np.ndarray                      # [n_paths]
+    rebalanced: dict = field(default_factory=dict)   # 頻度（か月） -> [n_paths]
+
+    def bonus(self, every):
+        return self.rebalanced[every] / self.buy_and_hold - 1.0
+
+    def summary(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        """ 最終資産とボーナスの平均・分位点の表 """
+        rows = {"buy_and_hold": self.buy_and_hold}
+        for every, w in self.rebalanced.items():
+            rows[f"rebalance_{every}m"] = w
+            rows[f"bonus_{every}m"] = self.bonus(every)
+        table = pd.DataFrame({name: np.r_[v.mean(), np.quantile(v, quantiles)]
+                              for name, v in rows.items()},
+                             index=["mean"] + [f"q{int(q * 100)}" for q in quantiles])
+        return table.T
+
+
+def _simulate_chunk(args):
+    seed, n_paths, T, n_assets, weights, frequencies, params = args
+    gross = generate_returns(n_paths, T, n_assets, seed=seed, **params)
+    bh = buy_and_hold_wealth(gross, weights)[:, -1]
+    rebal = {every: rebalanced_wealth(gross, weights, every)[:, -1] for every in frequencies}
+    return bh, rebal
+
+
+def simulate_bonus(n_paths=100_000, T=120, n_assets=2, weights=None, frequencies=(1, 3, 12),
+                   chunk_size=10_000, processes=1, seed=42, **params):
+    """
+    n_paths 本のパスで、バイ・アンド・ホールドと各頻度のリバランスの最終資産を求める。
+    パスは chunk_size 本ずつ作って計算する（メモリは chunk_size × T × n_assets 分で済む）。
+    processes > 1 ならチャンクをプロセスに分ける。各チャンクの乱数は seed から派生させるので、
+    processes を変えても結果は同じ。params は generate_returns に渡す（mu, sigma, rho）。
+    """
+    if weights is None:
+        weights = np.full(n_assets, 1.0 / n_assets)
+    sizes = [min(chunk_size, n_paths - i) for i in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(s, n, T, n_assets, weights, tuple(frequencies), params) for s, n in zip(seeds, sizes)]
+
+    if processes == 1:
+        parts = list(map(_simulate_chunk, tasks))
+    else:
+        with Pool(processes) as pool:
+            parts = pool.map(_simulate_chunk, tasks)
+
+    return BonusResult(
+        buy_and_hold=np.concatenate([bh for bh, _ in parts]),
+        rebalanced={every: np.concatenate([r[every] for _, r in parts]) for every in frequencies},
+    )
+
+
+# --- 乖離幅（バンド）でのリバランス ---
+# 目標ウェイトからの乖離が band を超えたときだけリバランスする。
+# 前回のリバランス時点からの累積リターンをまとめて計算し、最初にバンドを超える時点まで一気に進む。
+# リバランスのタイミングはウェイトだけで決まり、取引コストには依存しないので、
+# 1つのバンド幅について複数のコストを同時に評価できる。
+
+class ReturnPathCache:
+    """
+    同じ乱数のリターンパスを、累積対数リターン [batch, T + 1, n_assets]（先頭は 0）の形で
+    バッチごとに作って持っておく。ポリシーを変えて何度評価しても、パスは1回しか作らない。
+    cache_dir を指定するとバッチを .npy で保存してメモリマップで読む（メモリに載らない量のとき）。
+    """
+    def __init__(self, n_paths, T, n_assets, batch_size=2000, seed=42, cache_dir=None, **params):
+        self.n_paths = n_paths
+        self.T = T
+        self.n_assets = n_assets
+        self.params = params
+        self.cache_dir = cache_dir
+        self.sizes = [min(batch_size, n_paths - i) for i in range(0, n_paths, batch_size)]
+        self.seeds = np.random.SeedSequence(seed).spawn(len(self.sizes))
+        self._batches = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _make(self, k):
+        gross = generate_returns(self.sizes[k], self.T, self.n_assets, seed=self.seeds[k], **self.params)
+        log_cum = np.zeros((self.sizes[k], self.T + 1, self.n_assets))
+        np.cumsum(np.log(gross), axis=1, out=log_cum[:, 1:])
+        return log_cum
+
+    def batch(self, k):
+        if k in self._batches:
+            return self._batches[k]
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"paths_{k:05d}.npy")
+            if not os.path.exists(path):
+                np.save(path, self._make(k))
+            arr = np.load(path, mmap_mode="r")
+        else:
+            arr = self._make(k)
+        self._batches[k] = arr
+        return arr
+
+    def __iter__(self):
+        for k in range(len(self.sizes)):
+            yield self.batch(k)
+
+
+@dataclass
+class BandResult:
+    """ バンドリバランスの結果（パスごと） """
+    terminal_wealth: np.ndarray    # [n_paths, コストの数]
+    n_rebalances: np.ndarray       # [n_paths]
+    turnover: np.ndarray           # [n_paths] 売買したウェイトの合計（Σ|w - target| の総和）
+
+
+def band_rebalance(log_cum, target, band, costs=(0.0,), window=256):
+    """
+    累積対数リターン log_cum [n_paths, T + 1, n_assets] の各パスで、
+    いずれかの資産のウェイトが target から band を超えてずれた時点でリバランスする。
+    コストは売買額 × cost（売買額 = 資産 × Σ_i |w_i - target_i|）を資産から引く。
+
+    パスごとに「前回のリバランス時点」と「どこまで調べたか」を持ち、数ステップ分の
+    ウェイトをまとめて計算して最初の超過点に飛ぶ。ループ回数はリバランス回数程度で、
+    各回は残っている全パスをまとめて処理する。一度に調べる幅は、直近のリバランス間隔に
+    合わせて window を上限に伸び縮みさせる（無駄に先まで計算しない）。
+    """
+    n, t_end, n_assets = log_cum.shape[0], log_cum.shape[1] - 1, log_cum.shape[2]
+    target = np.asarray(target, dtype=float)
+    log_target = np.log(target)
+    costs = np.atleast_1d(np.asarray(costs, dtype=float))
+
+    ref = np.zeros(n, dtype=np.intp)      # 前回リバランスした時点
+    scan = np.zeros(n, dtype=np.intp)     # ここまでは超過なしと確認済み
+    log_growth = np.zeros(n)
+    log_cost = np.zeros((n, len(costs)))
+    n_rebal = np.zeros(n, dtype=np.int64)
+    turnover = np.zeros(n)
+    width = min(16, window)
+
+    active = np.arange(n)
+    while active.size:
+        t = scan[active, None] + np.arange(1, width + 1)      # [m, width]
+        valid = t <= t_end
+        np.minimum(t, t_end, out=t)
+        rows_all = active[:, None]
+        base = log_cum[active, ref[active]]
+        # 資産ごとに log(target_i × 前回からの伸び_i) を作る。ウェイトはこれの softmax
+        # （資産数は小さいので、最後の軸での集計より資産ごとの 2次元配列の方が速い）
+        x = [log_cum[rows_all, t, i] - base[:, i, None] + log_target[i] for i in range(n_assets)]
+        x_max = x[0].copy()
+        for xi in x[1:]:
+            np.maximum(x_max, xi, out=x_max)
+        e = [np.exp(xi - x_max) for xi in x]
+        total = sum(e)
+        dev = [np.abs(ei / total - ti) for ei, ti in zip(e, target)]
+        dev_max = dev[0].copy()
+        for di in dev[1:]:
+            np.maximum(dev_max, di, out=dev_max)
+        cross = (dev_max > band) & valid
+        has = cross.any(axis=1)
+
+        # バンドを超えたパス：その時点でリバランス
+        rows = np.flatnonzero(has)
+        first = cross[rows].argmax(axis=1)
+        hit = active[rows]
+        log_growth[hit] += np.log(total[rows, first]) + x_max[rows, first]
+        traded = sum(di[rows, first] for di in dev)
+        turnover[hit] += traded
+        log_cost[hit] += np.log1p(-np.outer(traded, costs))
+        n_rebal[hit] += 1
+        ref[hit] = scan[hit] = t[rows, first]
+
+        # 超えなかったパス：次の区間へ
+        miss = active[~has]
+        scan[miss] = np.minimum(scan[miss] + width, t_end)
+
+        # 最後まで調べたパスは、前回のリバランスから最後までの伸びを足して終わり
+        done = active[scan[active] >= t_end]
+        if done.size:
+            x_end = log_cum[done, t_end] - log_cum[done, ref[done]] + log_target
+            log_growth[done] += np.logaddexp.reduce(x_end, axis=-1)
+        active = active[scan[active] < t_end]
+
+        # 次に調べる幅：超えたパスが多ければ直近の間隔の2倍程度、少なければ広げる
+        if len(rows) * 2 > len(rows_all):
+            width = int(min(max(2 * first.mean() + 2, 4), window))
+        else:
+            width = min(2 * width, window)
+
+    return BandResult(np.exp(log_growth[:, None] + log_cost), n_rebal, turnover)
+
+
+def sweep_band_policies(cache, target, bands, costs, window=256):
+    """
+    バンド幅 × コストの組み合わせを、キャッシュした同じパスで評価して表にする。
+    コストはタイミングに影響しないので、バンド幅ごとに1回の走査で全コストを求める。
+    """
+    costs = list(costs)
+    rows = []
+    for band in bands:
+        parts = [band_rebalance(log_cum, target, band, costs, window) for log_cum in cache]
+        wealth = np.concatenate([p.terminal_wealth for p in parts])
+        n_rebal = np.concatenate([p.n_rebalances for p in parts])
+        turnover = np.concatenate([p.turnover for p in parts])
+        for j, cost in enumerate(costs):
+            w = wealth[:, j]
+            rows.append({
+                "band": band, "cost": cost,
+                "mean": w.mean(), "median": np.median(w), "q5": np.quantile(w, 0.05),
+                "rebalances": n_rebal.mean(), "turnover": turnover.mean(),
+            })
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    np.random.seed(42)
+
+    # 仮定: A, B は月ごと ±15%／-5% を交互に出す
+    T = 120  # 月数10年
+    ret_a = np.where(np.arange(T) % 2 == 0, 1.15, 0.95)
+    ret_b = np.where(np.arange(T) % 2 == 1, 1.15, 0.95)
+
+    cap_a = cap_b = cap_pf = 1.0
+    pf = []
+
+    for ra, rb in zip(ret_a, ret_b):
+        # 毎月50:50でリバランス
+        w1, w2 = 0.5, 0.5
+        cap_a *= ra
+        cap_b *= rb
+        total = cap_a + cap_b
+        cap_a, cap_b = total * w1, total * w2   # 再均等化
+        pf.append(total)
+
+    print("単体A累積:", cap_a)
+    print("単体B累積:", cap_b)
+    print("ポート累積:", pf[-1])        # > 1.0 になる
+
+    # 同じ経路をベクトル版で（[1パス, T, 2資産]。上の例は A, B に 1 ずつ、合計 2 から始めている）
+    gross = np.stack([ret_a, ret_b], axis=-1)[None]
+    print("ベクトル版 ポート累積:", 2 * rebalanced_wealth(gross, [0.5, 0.5], 1)[0, -1])
+    print("ベクトル版 放置:", 2 * buy_and_hold_wealth(gross, [0.5, 0.5])[0, -1])
+
+    # ランダムな 10 万パス × 5 資産
+    result = simulate_bonus(n_paths=100_000, T=120, n_assets=5, frequencies=(1, 3, 12), sigma=0.06)
+    print(result.summary().round(4))
+
+    # 日次 30 年・2 資産で、バンド幅 × コストを比較（同じパスを使い回す）
+    cache = ReturnPathCache(n_paths=5_000, T=252 * 30, n_assets=2, batch_size=1000,
+                            mu=0.0003, sigma=0.012)
+    table = sweep_band_policies(cache, target=[0.5, 0.5], bands=[0.02, 0.05, 0.10],
+                                costs=[0.0, 0.001, 0.005])
+    print(table.round(4))
@@ -1,5 +1,6 @@
 import streamlit as st
 import altair as alt
+import numpy as np
 import pandas as pd
 
 # ▼ 元データ例（x と y1〜10）
@@ -7,28 +8,158 @@ df = pd.DataFrame({
     "x": range(50),
     **{f"y{i}": [v * i * 0.1 for v in range(50)] for i in range(1, 11)}
 })
+SERIES = [f"y{i}" for i in range(1, 11)]
 
-# ▼ y1〜y10 を long 形式にまとめる
-#   id_vars="x"  → そのまま残す列
-#   value_vars   → y1〜y10 を1列に
-df_long = df.melt(
-    id_vars="x",
-    value_vars=[f"y{i}" for i in range(1, 11)],
-    var_name="series",   # y1, y2, ... が入るラベル列
-    value_name="y"        # y の値
-)
+
+# ▼ 間引き（ブラウザに送る点数を画面の横幅程度に抑える）
+#   どちらも x は昇順、ys は (系列数, 点数) の配列。
+#   返すのは系列ごとの元のインデックス (系列数, 残す点数)。
+def _bucket_starts(start, stop, n_buckets):
+    return np.unique(np.linspace(start, stop, n_buckets + 1).astype(np.intp)[:-1])
+
+
+def minmax_indices(ys, n_buckets):
+    """
+    バケツ（≒1ピクセル幅）ごとに最小値と最大値の点を残す。全系列まとめてベクトル演算で行う。
+    線グラフの見た目（縦のギザギザ）が崩れない。
+    nan は無視して集計し、全部 nan のバケツはその先頭の点（nan のまま＝線の切れ目）を残す。
+    """
+    n = ys.shape[1]
+    if n <= 2 * n_buckets:
+        return np.broadcast_to(np.arange(n), ys.shape)
+    starts = _bucket_starts(0, n, n_buckets)
+    counts = np.diff(np.r_[starts, n])
+    pos = np.broadcast_to(np.arange(n), ys.shape)
+
+    def first_where(reduced):
+        # バケツ内で値が最小/最大になる最初の位置
+        hit = ys == np.repeat(reduced, counts, axis=1)
+        first = np.minimum.reduceat(np.where(hit, pos, n), starts, axis=1)
+        return np.where(first == n, starts, first)
+
+    # fmin / fmax は nan を無視する（バケツが全部 nan のときだけ nan になる）
+    lo = first_where(np.fmin.reduceat(ys, starts, axis=1))
+    hi = first_where(np.fmax.reduceat(ys, starts, axis=1))
+    return np.sort(np.concatenate([lo, hi], axis=1), axis=1)
+
+
+def lttb_indices(x, ys, n_out):
+    """
+    Largest-Triangle-Three-Buckets。最初と最後の点は残し、間を n_out - 2 個のバケツに分けて、
+    「前に選んだ点」と「次のバケツの平均点」と作る三角形が最大になる点を選ぶ。
+    バケツ方向は前の選択に依存するのでループだが、各ステップは全系列まとめて計算する。
+    nan の点は平均にも三角形の候補にも使わない（バケツが全部 nan なら先頭の点を残して線を切る）。
+    """
+    n_series, n = ys.shape
+    if n <= n_out or n_out < 3:
+        return np.broadcast_to(np.arange(n), ys.shape)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    x = np.asarray(x, dtype=float)
+
+    # 各バケツの平均点（次のバケツの代表として使う）をまとめて求める。
+    # nan を 0 にした累積和と、有効な点の数の累積和から、有効な点だけの平均を出す
+    # （nan がそのまま累積和に入ると、それ以降の全バケツの平均が nan になる）
+    valid = ~np.isnan(ys)
+    zeros = np.zeros((n_series, 1))
+    cum_x = np.concatenate([zeros, np.cumsum(np.where(valid, x, 0.0), axis=1)], axis=1)
+    cum_y = np.concatenate([zeros, np.cumsum(np.where(valid, ys, 0.0), axis=1)], axis=1)
+    cum_n = np.concatenate([zeros, np.cumsum(valid, axis=1)], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        seg_n = cum_n[:, edges[1:]] - cum_n[:, edges[:-1]]
+        avg_x = (cum_x[:, edges[1:]] - cum_x[:, edges[:-1]]) / seg_n
+        avg_y = (cum_y[:, edges[1:]] - cum_y[:, edges[:-1]]) / seg_n
+    avg_x = np.concatenate([avg_x, np.full((n_series, 1), x[-1])], axis=1)
+    avg_y = np.concatenate([avg_y, ys[:, -1:]], axis=1)
+
+    out = np.empty((n_series, n_out), dtype=np.intp)
+    out[:, 0] = 0
+    out[:, -1] = n - 1
+    rows = np.arange(n_series)
+    a = np.zeros(n_series, dtype=np.intp)
+    for b in range(n_out - 2):
+        s, e = edges[b], edges[b + 1]
+        ax, ay = x[a], ys[rows, a]
+        cx, cy = avg_x[:, b + 1], avg_y[:, b + 1]
+        # 次のバケツが全部 nan なら、このバケツの平均点を代わりの頂点にする
+        no_next = np.isnan(cy)
+        cx, cy = np.where(no_next, avg_x[:, b], cx), np.where(no_next, avg_y[:, b], cy)
+        bx, by = x[s:e], ys[:, s:e]
+        # 三角形の面積の2倍（符号なし）。nan の点は選ばれないよう -1 にする
+        area = np.abs((ax - cx)[:, None] * (by - ay[:, None])
+                      - (ax[:, None] - bx) * (cy - ay)[:, None])
+        area[np.isnan(area)] = -1.0
+        a = s + np.argmax(area, axis=1)
+        out[:, b + 1] = a
+    return out
+
+
+def downsample_long(x, ys, names, n_pixels, method="lttb"):
+    """
+    系列ごとに間引いてから、直接 long 形式（x, series, y）を作る。
+    元データ全体を melt したコピーは作らない。
+    """
+    if method == "lttb":
+        idx = lttb_indices(x, ys, n_pixels)
+    else:
+        idx = minmax_indices(ys, n_pixels // 2)
+    rows = np.arange(ys.shape[0])[:, None]
+    return pd.DataFrame({
+        "x": np.asarray(x)[idx].ravel(),
+        "series": np.repeat(np.asarray(names), idx.shape[1]),
+        "y": ys[rows, idx].ravel(),
+    })
+
+
+@st.cache_data
+def wide_arrays(_df, data_version, names=tuple(SERIES)):
+    """ 元の横長データから x（昇順）と (系列数, 点数) の配列を取り出す """
+    x = _df["x"].to_numpy(dtype=float)
+    ys = _df[list(names)].to_numpy(dtype=float).T.copy()
+    return x, ys
+
+
+@st.cache_data
+def visible_long(data_version, x_range, n_pixels, method, _x, _ys, names=tuple(SERIES)):
+    """ 表示中の x 範囲だけを、横幅に合わせた解像度で間引く（ズームすると細かくなる） """
+    lo, hi = np.searchsorted(_x, x_range[0], side="left"), np.searchsorted(_x, x_range[1], side="right")
+    # 線が画面の端で途切れないよう、範囲の外側の1点ずつも含める
+    lo, hi = max(lo - 1, 0), min(hi + 1, len(_x))
+    return downsample_long(_x[lo:hi], _ys[:, lo:hi], names, n_pixels, method)
+
+
+DATA_VERSION = 1
+x, ys = wide_arrays(df, DATA_VERSION)
+
+# ▼ 間引きの設定（Streamlit からはコンテナの幅が取れないので、幅はピクセルで指定する）
+with st.sidebar:
+    n_pixels = st.number_input("描画幅（px）", min_value=100, max_value=4000, value=1200, step=100)
+    method = st.radio("間引き方法", ["lttb", "minmax"], horizontal=True)
+
+# ▼ 範囲をドラッグで選ぶとその範囲を拡大（再計算で解像度が上がる）
+full_range = (float(x[0]), float(x[-1]))
+if "x_range" not in st.session_state or st.button("全体を表示"):
+    st.session_state["x_range"] = full_range
+x_range = st.session_state["x_range"]
+
+df_long = visible_long(DATA_VERSION, x_range, int(n_pixels), method, x, ys)
 
 # ▼ Altair 散布図
+zoom = alt.selection_interval(encodings=["x"], name="zoom")
 chart = (
     alt.Chart(df_long)
     .mark_circle(size=55)
     .encode(
-        x=alt.X("x:Q", axis=None),
+        x=alt.X("x:Q", axis=None, scale=alt.Scale(domain=list(x_range))),
         y=alt.Y("y:Q", axis=None),
         color=alt.Color("series:N"),   # series 列ごとに色分け
     )
-    .interactive()  # ← ズーム・パンだけ付く
+    .add_params(zoom)
 )
 
-# ▼ Streamlit で描画
-st.altair_chart(chart, use_container_width=True)
\ No newline at end of file
+# ▼ Streamlit で描画（選択した範囲は再実行時に受け取る）
+event = st.altair_chart(chart, use_container_width=True, on_select="rerun", key="multiseries")
+selected = event.selection.get("zoom", {}).get("x") if event else None
+if selected and tuple(selected) != x_range:
+    st.session_state["x_range"] = (float(min(selected)), float(max(selected)))
+    st.rerun()
+st.caption(f"表示点数: {len(df_long):,} / 元の点数: {ys.size:,}")
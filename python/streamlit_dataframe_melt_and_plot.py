@@ -1,3 +1,5 @@
+import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
 import matplotlib.pyplot as plt
@@ -26,94 +28,254 @@ data = {
     ]
 }
 
-# データフレームを作成し、日付をdatetime型に変換
-df = pd.DataFrame(data)
-df['Date'] = pd.to_datetime(df['Date'])
+PERSONS = ["Taro", "Jiro", "hanako"]
+# データを差し替えたら上げる（st.cache_data のキーになる）。ファイルから読むなら更新時刻などを使う
+DATA_VERSION = 1
+
+
+def _week_month_keys(dates):
+    """
+    日付から (月の通し番号, 週の開始日の通し日数) を整数で作る。
+    Period を行ごとに作る to_period より速く、集計後に Period に戻す。
+    週は to_period('W') と同じ月曜始まり。
+    """
+    dates = pd.DatetimeIndex(dates)
+    month = (dates.year - 1970) * 12 + (dates.month - 1)
+    day = dates.to_numpy().astype("datetime64[D]").astype(np.int64)
+    week = day - dates.dayofweek.to_numpy()
+    return month.to_numpy(), week
+
+
+def weekly_totals_wide(df_wide, persons=PERSONS):
+    """
+    横長のデータ（Date + 担当者ごとの列）のまま (Month, Week) ごとに合計する。
+    melt した縦長のコピー（行数×人数）は作らない。
+    戻り値は index=(Month, Week) の整数キー、列=担当者 の表。
+    """
+    month, week = _week_month_keys(pd.to_datetime(df_wide["Date"]))
+    values = df_wide[persons]
+    return values.groupby([month, week]).sum().rename_axis(["Month", "Week"])
+
+
+def update_weekly_totals(weekly, new_rows, persons=PERSONS):
+    """ 追加された行だけを集計し、該当する週のバケツにだけ足し込む """
+    delta = weekly_totals_wide(new_rows, persons)
+    index = weekly.index.union(delta.index)
+    if len(index) != len(weekly):
+        weekly = weekly.reindex(index, fill_value=0)   # 新しい週のバケツを作る
+    else:
+        weekly = weekly.copy()
+    weekly.loc[delta.index, persons] += delta[persons]
+    return weekly
+
+
+def weekly_totals_long(weekly, persons=PERSONS):
+    """ 週ごとの集計（小さい表）を Person, Month, Week, Value の縦長に直す """
+    long = weekly[persons].rename_axis(columns="Person").stack().rename("Value").reset_index()
+    long["Month"] = pd.PeriodIndex.from_ordinals(long["Month"].to_numpy(), freq="M")
+    long["Week"] = pd.PeriodIndex.from_ordinals(
+        (long["Week"].to_numpy() + 10) // 7, freq="W")  # 序数 0 は 1969-12-22（月）始まりの週
+    return long[["Person", "Month", "Week", "Value"]].sort_values(
+        ["Person", "Month", "Week"], ignore_index=True)
+
+
+@st.cache_data
+def load_data(data_version):
+    """ データソースを読み込む（例ではコード内のデータ） """
+    df = pd.DataFrame(data)
+    df["Date"] = pd.to_datetime(df["Date"])
+    return df
+
+
+@st.cache_data
+def cached_weekly_totals(data_version, _df_wide, persons=tuple(PERSONS)):
+    """ data_version が変わったときだけ集計し直す（_df_wide はハッシュしない） """
+    return weekly_totals_wide(_df_wide, list(persons))
+
+
+df = load_data(DATA_VERSION)
 st.write(df)
-# 月ごとに週単位でデータを集計
-df['Week'] = df['Date'].dt.to_period('W')
-df['Month'] = df['Date'].dt.to_period('M')
 
-# 各担当者ごとのデータを抽出して集計
-total_weekly_sum = df.melt(id_vars=['Date', 'Week', 'Month'], value_vars=['Taro', 'Jiro', 'hanako'], var_name='Person', value_name='Value')
-total_weekly_sum = total_weekly_sum.groupby(['Person', 'Month', 'Week']).sum(numeric_only=True).reset_index()
+# 月ごとに週単位でデータを集計（再実行時はキャッシュから取り出すだけ）
+weekly = cached_weekly_totals(DATA_VERSION, df)
+
+# 後から届いた行は、影響する週だけ更新する
+if "weekly" not in st.session_state or st.session_state.get("weekly_version") != DATA_VERSION:
+    st.session_state["weekly"] = weekly
+    st.session_state["weekly_version"] = DATA_VERSION
+if st.button("行を追加（例）"):
+    new_rows = pd.DataFrame({"Date": pd.to_datetime(["2024/05/25"]),
+                             "Taro": [100.0], "Jiro": [50.0], "hanako": [10.0]})
+    st.session_state["weekly"] = update_weekly_totals(st.session_state["weekly"], new_rows)
+
+total_weekly_sum = weekly_totals_long(st.session_state["weekly"])
 st.write(total_weekly_sum)
+
 # Streamlitアプリケーション
 st.title("担当者別の月ごとの週単位積み上げ棒グラフ")
 
-# グラフの描画
-fig, axes = plt.subplots(1, 3, figsize=(18, 5), sharey=True)
+FACETS_PER_PAGE = 12    # 1つのチャートに並べる担当者の数
+FACET_COLUMNS = 4
 
-# 各担当者ごとにグラフを作成
-for ax, (person, group) in zip(axes, total_weekly_sum.groupby('Person')):
-    person_pivot = group.pivot(index='Month', columns='Week', values='Value').fillna(0)
-    person_pivot.plot(kind='bar', stacked=True, ax=ax, legend=False, width=0.7)
-    ax.set_title(f"{person}'s weekly stacked bar by month")
-    ax.set_xlabel("Month")
-    ax.set_ylabel("Total value")
-    ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha='right')
 
-# グラフのカスタマイズ
-fig.tight_layout()
-axes[-1].legend(title="Week", loc='upper center', bbox_to_anchor=(-0.1, -0.15), ncol=5)
+def person_slices(long, start, end):
+    """ 期間（Month の範囲）で絞った縦長の表を担当者ごとに分ける """
+    in_range = long[(long["Month"] >= start) & (long["Month"] <= end)]
+    return {person: group for person, group in in_range.groupby("Person", sort=True)}
 
-# Streamlitにプロットを表示
-st.pyplot(fig)
 
+def slice_fingerprint(frame):
+    """ 担当者1人分の中身が変わったかどうかを見るためのハッシュ """
+    return int(pd.util.hash_pandas_object(frame, index=False).sum())
 
-# figsize パラメータ：
 
-# fig, axes = plt.subplots(1, 3, figsize=(18, 5), sharey=True) の figsize パラメータを調整することで、グラフの横幅を小さくすることにより、グラフ間の距離を縮めることができます。
-# fig.tight_layout()：
+@st.cache_data
+def person_chart_data(person, start, end, fingerprint, _frame):
+    """
+    担当者1人・期間1つ分の、Altair に渡す形のデータ。
+    (person, 期間, 中身のハッシュ) が同じなら再利用する。
+    """
+    return _frame.assign(Month=_frame["Month"].astype(str), Week=_frame["Week"].astype(str))
 
-# fig.tight_layout() はグラフ間の余白を自動的に調整します。この関数のパラメータ pad を使って、余白をさらに縮めることも可能です。
 
+@st.cache_data
+def faceted_chart_spec(keys, _frames, columns=FACET_COLUMNS):
+    """
+    担当者ごとのデータをまとめて、Person でファセットした1つのチャート仕様にする。
+    keys は各担当者の (person, 期間, ハッシュ)。変わった担当者を含むページだけ作り直す。
+    """
+    chart = (
+        alt.Chart(pd.concat(_frames, ignore_index=True))
+        .mark_bar()
+        .encode(
+            x=alt.X("Month:N", title="Month", axis=alt.Axis(labelAngle=-45)),
+            y=alt.Y("sum(Value):Q", title="Total value"),
+            color=alt.Color("Week:N", legend=None),   # 週が多いので凡例は出さずツールチップで見る
+            tooltip=["Person:N", "Month:N", "Week:N", alt.Tooltip("Value:Q", format=".2f")],
+        )
+        .properties(width=180, height=150)
+        .facet(facet=alt.Facet("Person:N", title=None), columns=columns)
+        .resolve_scale(y="shared")
+    )
+    return chart.to_dict()
+
+
+def render_altair_facets(long):
+    """ ファセット表示。ページ単位で、「さらに表示」を押すたびに次のページを描く """
+    months = sorted(long["Month"].unique())
+    if not months:
+        st.caption("データがありません")
+        return
+    start, end = st.select_slider("期間", options=months, value=(months[0], months[-1]),
+                                  format_func=str)
+    slices = person_slices(long, start, end)
+    persons = list(slices)
+
+    range_key = (str(start), str(end))
+    if st.session_state.get("facet_range") != range_key:
+        st.session_state["facet_range"] = range_key
+        st.session_state["facet_pages"] = 1
+    n_pages = -(-len(persons) // FACETS_PER_PAGE)
+    shown = min(st.session_state.get("facet_pages", 1), n_pages)
 
-df.melt() は、**データフレームの再構成（リフォーマット）**を行う関数で、列を行に変換することでデータを「縦長」形式に変換します。具体的には、今回のコードで melt() がどのように動作しているか解説します。
+    for page in range(shown):
+        page_persons = persons[page * FACETS_PER_PAGE:(page + 1) * FACETS_PER_PAGE]
+        keys, frames = [], []
+        for person in page_persons:
+            key = (person, str(start), str(end), slice_fingerprint(slices[person]))
+            keys.append(key)
+            frames.append(person_chart_data(*key, slices[person]))
+        st.vega_lite_chart(faceted_chart_spec(tuple(keys), frames), use_container_width=False)
 
-元のデータフレーム構造
-元のデータフレーム df は次のようになっています：
+    st.caption(f"{min(shown * FACETS_PER_PAGE, len(persons))} / {len(persons)} 人を表示中")
+    if shown < n_pages and st.button("さらに表示"):
+        st.session_state["facet_pages"] = shown + 1
+        st.rerun()
 
-Date	Taro	Jiro	hanako
-2024/01/04	873.66	726.21	133.95
-2024/01/05	684.63	451.53	97.55
-...	...	...	...
-これに対して、Taro, Jiro, hanako という列を持つデータを、melt() 関数を用いて変形し、それぞれの値を1列にまとめた「縦長」形式にします。
 
-melt() の引数の意味
-python
-コードをコピーする
-df.melt(id_vars=['Date', 'Week', 'Month'], value_vars=['Taro', 'Jiro', 'hanako'], var_name='Person', value_name='Value')
-この melt() 関数は以下のように動作します：
+def render_matplotlib(long):
+    """ 従来の表示（担当者ごとに積み上げ棒グラフを並べる。人数が少ないとき向け） """
+    groups = list(long.groupby('Person'))
+    fig, axes = plt.subplots(1, len(groups), figsize=(6 * len(groups), 5), sharey=True, squeeze=False)
+    axes = axes[0]
 
-id_vars=['Date', 'Week', 'Month']:
+    # 各担当者ごとにグラフを作成
+    for ax, (person, group) in zip(axes, groups):
+        person_pivot = group.pivot(index='Month', columns='Week', values='Value').fillna(0)
+        person_pivot.plot(kind='bar', stacked=True, ax=ax, legend=False, width=0.7)
+        ax.set_title(f"{person}'s weekly stacked bar by month")
+        ax.set_xlabel("Month")
+        ax.set_ylabel("Total value")
+        ax.set_xticklabels(ax.get_xticklabels(), rotation=45, ha='right')
 
-**保持する列（キー列）**を指定します。この場合、Date, Week, Month の各列をそのまま残し、他の列（Taro, Jiro, hanako）を変換の対象にします。
-これらはインデックスのような役割を持つ情報です。
-value_vars=['Taro', 'Jiro', 'hanako']:
+    # グラフのカスタマイズ
+    fig.tight_layout()
+    axes[-1].legend(title="Week", loc='upper center', bbox_to_anchor=(-0.1, -0.15), ncol=5)
 
-**変換する列（ピボット対象列）**を指定します。この場合、Taro, Jiro, hanako の各列のデータが変換され、1列にまとめられます。
-これにより、複数の列から1つの列にデータが集約されます。
-var_name='Person':
+    # Streamlitにプロットを表示
+    st.pyplot(fig)
 
-元々の列名（Taro, Jiro, hanako）が入る新しい列名を指定します。この場合、新しい列名は 'Person' となります。
-新しい列 'Person' には、各担当者の名前（Taro, Jiro, hanako）が入ります。
-value_name='Value':
 
-元のデータ（値）が格納される新しい列の名前を指定します。この場合、新しい列名は 'Value' となります。
-新しい列 'Value' には、Taro, Jiro, hanako 各列の数値データが順に格納されます。
-変換後のデータフレーム構造
-melt() を適用すると、データフレームの構造は以下のように変わります：
+# グラフの描画
+render_mode = st.radio("表示方法", ["Altair（ファセット）", "matplotlib"], horizontal=True)
+if render_mode == "matplotlib":
+    render_matplotlib(total_weekly_sum)
+else:
+    render_altair_facets(total_weekly_sum)
+
+# figsize パラメータ：
+
+# fig, axes = plt.subplots(1, 3, figsize=(18, 5), sharey=True) の figsize パラメータを調整することで、グラフの横幅を小さくすることにより、グラフ間の距離を縮めることができます。
+# fig.tight_layout()：
+
+# fig.tight_layout() はグラフ間の余白を自動的に調整します。この関数のパラメータ pad を使って、余白をさらに縮めることも可能です。
 
-Date	Week	Month	Person	Value
-2024/01/04	2024-01-01	2024-01	Taro	873.66
-2024/01/04	2024-01-01	2024-01	Jiro	726.21
-2024/01/04	2024-01-01	2024-01	hanako	133.95
-2024/01/05	2024-01-01	2024-01	Taro	684.63
-2024/01/05	2024-01-01	2024-01	Jiro	451.53
-2024/01/05	2024-01-01	2024-01	hanako	97.55
-...	...	...	...	...
-この変換により、元々の3つの列（Taro, Jiro, hanako）がすべて 'Person' という1つの列にまとまり、その値が 'Value' という列に格納されます。
 
-なぜこの変換が必要なのか？
-この「縦長」形式にすることで、pandas の groupby() や matplotlib などのツールで簡単にデータを集計・可視化しやすくなります。各担当者ごとの集計や処理を行う場合、この形式が非常に扱いやすいため、グラフの描画や分析が効率的になります。
+# df.melt() は、**データフレームの再構成（リフォーマット）**を行う関数で、列を行に変換することでデータを「縦長」形式に変換します。具体的には、今回のコードで melt() がどのように動作しているか解説します。
+#
+# 元のデータフレーム構造
+# 元のデータフレーム df は次のようになっています：
+#
+# Date	Taro	Jiro	hanako
+# 2024/01/04	873.66	726.21	133.95
+# 2024/01/05	684.63	451.53	97.55
+# ...	...	...	...
+# これに対して、Taro, Jiro, hanako という列を持つデータを、melt() 関数を用いて変形し、それぞれの値を1列にまとめた「縦長」形式にします。
+#
+# melt() の引数の意味
+# python
+# コードをコピーする
+# df.melt(id_vars=['Date', 'Week', 'Month'], value_vars=['Taro', 'Jiro', 'hanako'], var_name='Person', value_name='Value')
+# この melt() 関数は以下のように動作します：
+#
+# id_vars=['Date', 'Week', 'Month']:
+#
+# **保持する列（キー列）**を指定します。この場合、Date, Week, Month の各列をそのまま残し、他の列（Taro, Jiro, hanako）を変換の対象にします。
+# これらはインデックスのような役割を持つ情報です。
+# value_vars=['Taro', 'Jiro', 'hanako']:
+#
+# **変換する列（ピボット対象列）**を指定します。この場合、Taro, Jiro, hanako の各列のデータが変換され、1列にまとめられます。
+# これにより、複数の列から1つの列にデータが集約されます。
+# var_name='Person':
+#
+# 元々の列名（Taro, Jiro, hanako）が入る新しい列名を指定します。この場合、新しい列名は 'Person' となります。
+# 新しい列 'Person' には、各担当者の名前（Taro, Jiro, hanako）が入ります。
+# value_name='Value':
+#
+# 元のデータ（値）が格納される新しい列の名前を指定します。この場合、新しい列名は 'Value' となります。
+# 新しい列 'Value' には、Taro, Jiro, hanako 各列の数値データが順に格納されます。
+# 変換後のデータフレーム構造
+# melt() を適用すると、データフレームの構造は以下のように変わります：
+#
+# Date	Week	Month	Person	Value
+# 2024/01/04	2024-01-01	2024-01	Taro	873.66
+# 2024/01/04	2024-01-01	2024-01	Jiro	726.21
+# 2024/01/04	2024-01-01	2024-01	hanako	133.95
+# 2024/01/05	2024-01-01	2024-01	Taro	684.63
+# 2024/01/05	2024-01-01	2024-01	Jiro	451.53
+# 2024/01/05	2024-01-01	2024-01	hanako	97.55
+# ...	...	...	...	...
+# この変換により、元々の3つの列（Taro, Jiro, hanako）がすべて 'Person' という1つの列にまとまり、その値が 'Value' という列に格納されます。
+#
+# なぜこの変換が必要なのか？
+# この「縦長」形式にすることで、pandas の groupby() や matplotlib などのツールで簡単にデータを集計・可視化しやすくなります。各担当者ごとの集計や処理を行う場合、この形式が非常に扱いやすいため、グラフの描画や分析が効率的になります。
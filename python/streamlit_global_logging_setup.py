@@ -1,6 +1,20 @@
+import atexit
+import contextlib
+import functools
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+import weakref
 import streamlit as st
 
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+class GlobalStreamHandler(logging.StreamHandler):
+    """ setup_global_logger が付けたハンドラーの目印（キュー方式に切り替えるときに外す） """
+
+
 # グローバルロガー設定関数
 @st.cache_resource
 def setup_global_logger():
@@ -8,15 +22,355 @@ def setup_global_logger():
     root_logger = logging.getLogger()
     if not root_logger.handlers:
         # 共通のハンドラーを設定
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        handler = GlobalStreamHandler()
+        formatter = logging.Formatter(LOG_FORMAT)
         handler.setFormatter(formatter)
         root_logger.addHandler(handler)
         root_logger.setLevel(logging.INFO)  # 必要に応じてDEBUGやWARNINGに変更
     return root_logger
 
+
+class DeferredFormatQueueHandler(logging.handlers.QueueHandler):
+    """
+    キューに積むだけの QueueHandler。
+    標準の prepare() は呼び出し元のスレッドでメッセージを整形してしまうので、
+    整形は QueueListener 側（別スレッド）に任せる。
+    （同じプロセス内でしか使わないので、レコードを pickle できる形にする必要はない）
+    """
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    ロガーごとのレート制限（トークンバケット）。1秒あたり rate 件、最大 burst 件まで通す。
+    捨てた件数は次に通ったレコードのメッセージに付ける。
+    """
+    def __init__(self, rate, burst=None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1.0:
+                self._dropped += 1
+                return False
+            self._tokens -= 1.0
+            dropped, self._dropped = self._dropped, 0
+        if dropped:
+            record.msg = f"{record.msg} (他 {dropped} 件をレート制限で省略)"
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """ every_n 件に1件だけ通す（WARNING 以上は常に通す） """
+    def __init__(self, every_n):
+        super().__init__()
+        self.every_n = every_n
+        self._count = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        self._count += 1
+        return (self._count - 1) % self.every_n == 0
+
+
+def _stop_queue_logging(root_logger):
+    listener = getattr(root_logger, "_queue_listener", None)
+    if listener is None:
+        return
+    listener.stop()  # キューに残っているレコードを書き出してからスレッドを止める
+    for handler in listener.handlers:
+        handler.close()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, DeferredFormatQueueHandler):
+            root_logger.removeHandler(handler)
+    for logger, log_filter in getattr(root_logger, "_queue_filters", ()):
+        logger.removeFilter(log_filter)
+    root_logger._queue_listener = None
+    root_logger._queue_filters = []
+
+
+def shutdown_queue_logging():
+    """ リスナーを止めてルートロガーから外す（アプリ終了時に atexit からも呼ばれる） """
+    _stop_queue_logging(logging.getLogger())
+
+
+# キュー方式のグローバルロガー設定関数
+@st.cache_resource
+def setup_queue_logger(log_file=None, max_bytes=10 * 1024 * 1024, backup_count=5,
+                       rate_limits=(), sampling=(), level=logging.INFO):
+    """
+    ルートロガーには QueueHandler だけを付け、整形と出力は QueueListener の
+    1本のスレッドで行う（スクリプトのスレッドはキューに積むだけ）。
+
+    log_file:    指定したときだけ、ローテーションするファイルにも出力する
+    rate_limits: (ロガー名, 1秒あたりの件数) のタプル。例: (("tool1_logger", 50),)
+    sampling:    (ロガー名, N件に1件) のタプル。例: (("tool2_logger", 10),)
+    引数はハッシュ可能である必要がある（st.cache_resource のキーになるため）。
+    """
+    root_logger = logging.getLogger()
+    # 引数を変えて呼ばれても、以前のリスナーは止めてから付け替える（二重出力を防ぐ）
+    # （再実行でモジュールの変数は初期化されるので、状態はロガー側に持たせる）
+    # 外すのはこのモジュールで付けたハンドラーとフィルターだけで、ほかで付けられたハンドラーはそのまま残す
+    # （setup_global_logger の同期出力のハンドラーが残ると、二重出力になり整形もスクリプト側に残る）
+    _stop_queue_logging(root_logger)
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, GlobalStreamHandler):
+            root_logger.removeHandler(handler)
+            handler.close()
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    root_logger.addHandler(DeferredFormatQueueHandler(log_queue))
+    root_logger.setLevel(level)
+    root_logger._queue_listener = listener
+
+    # 頻繁にログを出すロガーは、キューに積む前に間引く
+    filters = [(logging.getLogger(name), RateLimitFilter(rate)) for name, rate in rate_limits]
+    filters += [(logging.getLogger(name), SamplingFilter(every_n)) for name, every_n in sampling]
+    for logger, log_filter in filters:
+        logger.addFilter(log_filter)
+    root_logger._queue_filters = filters
+
+    if not getattr(root_logger, "_queue_atexit", False):
+        atexit.register(shutdown_queue_logging)
+        root_logger._queue_atexit = True
+    return listener
+
+
+# --- 計測（どこで時間がかかっているかを見るための軽量な仕組み） ---
+class _SpanStats:
+    """ 1スレッド・1スパン分の集計。書き込むのは持ち主のスレッドだけなのでロック不要 """
+    __slots__ = ("count", "total", "max", "samples", "pos")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []   # パーセンタイル用に直近 sample_size 件だけ持つ
+        self.pos = 0
+
+    def add(self, elapsed, sample_size):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        if len(self.samples) < sample_size:
+            self.samples.append(elapsed)
+        else:
+            self.samples[self.pos] = elapsed
+            self.pos = (self.pos + 1) % sample_size
+
+    def merge(self, other, sample_size):
+        """ 終了したスレッドの集計を取り込む（サンプルは直近 sample_size 件まで） """
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.samples.extend(other.samples)
+        del self.samples[:-sample_size]
+        self.pos = 0
+
+
+class _Span:
+    __slots__ = ("_inst", "_name", "_t0")
+
+    def __init__(self, inst, name):
+        self._inst = inst
+        self._name = name
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._inst.record(self._name, time.perf_counter() - self._t0)
+        return False
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Instrumentation:
+    """
+    名前付きスパンの呼び出し回数・合計/最大時間・パーセンタイルを集める。
+
+        inst = get_instrumentation()
+        with inst.span("load_csv"):
+            ...
+        @inst.instrument("tool1.run")
+        def run(): ...
+
+    記録は各スレッド専用の辞書に書くだけ（ロックを取らない）。
+    集計（snapshot）のときに全スレッド分を読んでまとめる。
+    Streamlit は再実行のたびに短命なスレッドでスクリプトを動かすので、終了したスレッドの辞書は
+    snapshot のときに1つの集計に畳み込んで手放す（スレッドの数だけ辞書が溜まり続けないように）。
+    無効のときは span() が使い回しの nullcontext を返し、デコレータは元の関数を呼ぶだけ。
+    """
+    SAMPLE_SIZE = 1024
+
+    def __init__(self, enabled=True, logger_name="instrumentation"):
+        self.enabled = enabled
+        self.logger = logging.getLogger(logger_name)
+        self._local = threading.local()
+        self._thread_stats = []       # 全スレッドの (スレッドへの弱参照, {スパン名: _SpanStats})
+        self._retired = {}            # 終了したスレッドの分をまとめた {スパン名: _SpanStats}
+        self._register_lock = threading.Lock()   # スレッドが初めて記録するときだけ使う
+        self._reporter = None
+        self._stop = threading.Event()
+
+    def _stats(self):
+        stats = getattr(self._local, "stats", None)
+        if stats is None:
+            stats = self._local.stats = {}
+            with self._register_lock:
+                self._thread_stats.append((weakref.ref(threading.current_thread()), stats))
+        return stats
+
+    def _retire_dead_threads(self):
+        """ 終了したスレッドの集計を self._retired に畳み込み、一覧から外す """
+        with self._register_lock:
+            alive = []
+            for ref, stats in self._thread_stats:
+                thread = ref()
+                if thread is not None and thread.is_alive():
+                    alive.append((ref, stats))
+                    continue
+                for name, s in stats.items():
+                    self._retired.setdefault(name, _SpanStats()).merge(s, self.SAMPLE_SIZE)
+            self._thread_stats = alive
+            return [self._retired] + [stats for _, stats in alive]
+
+    def record(self, name, elapsed):
+        stats = self._stats()
+        s = stats.get(name)
+        if s is None:
+            s = stats[name] = _SpanStats()
+        s.add(elapsed, self.SAMPLE_SIZE)
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def instrument(self, name=None):
+        """ 関数の実行時間を記録するデコレータ（name 省略時は関数の修飾名） """
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                t0 = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(span_name, time.perf_counter() - t0)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """ 全スレッド分をまとめた集計（スパン名順の dict のリスト、時間はミリ秒） """
+        merged = {}
+        for stats in self._retire_dead_threads():
+            for name, s in list(stats.items()):
+                m = merged.setdefault(name, [0, 0.0, 0.0, []])
+                m[0] += s.count
+                m[1] += s.total
+                m[2] = max(m[2], s.max)
+                m[3].extend(s.samples)
+        rows = []
+        for name in sorted(merged):
+            count, total, peak, samples = merged[name]
+            samples.sort()
+
+            def pct(q):
+                return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000 if samples else 0.0
+
+            rows.append({
+                "span": name, "count": count,
+                "total_ms": total * 1000, "mean_ms": total / count * 1000 if count else 0.0,
+                "max_ms": peak * 1000, "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+            })
+        return rows
+
+    def log_summary(self):
+        for r in self.snapshot():
+            self.logger.info(
+                "%s: count=%d total=%.1fms mean=%.2fms p50=%.2fms p95=%.2fms p99=%.2fms max=%.2fms",
+                r["span"], r["count"], r["total_ms"], r["mean_ms"],
+                r["p50_ms"], r["p95_ms"], r["p99_ms"], r["max_ms"])
+
+    def start_reporter(self, interval=60.0):
+        """ interval 秒ごとに集計をロガーに出すスレッドを起動する（二重には起動しない） """
+        if self._reporter is not None and self._reporter.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                if self.enabled:
+                    self.log_summary()
+
+        self._stop.clear()
+        self._reporter = threading.Thread(target=run, name="instrumentation-reporter", daemon=True)
+        self._reporter.start()
+
+    def stop_reporter(self):
+        self._stop.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+
+
+# 再実行をまたいで集計を引き継ぐため、インスタンスは st.cache_resource に置く
+@st.cache_resource
+def get_instrumentation(enabled=True, report_interval=60.0):
+    inst = Instrumentation(enabled=enabled)
+    if enabled and report_interval:
+        inst.start_reporter(report_interval)
+        # ログのリスナーより先に止まるよう、後から登録する（atexit は逆順に呼ばれる）
+        atexit.register(inst.stop_reporter)
+    return inst
+
+
+def render_instrumentation_sidebar(inst):
+    """ サイドバーに現在の集計表を出す（必要なページでだけ呼ぶ） """
+    with st.sidebar:
+        st.subheader("計測")
+        inst.enabled = st.checkbox("計測を有効にする", value=inst.enabled)
+        rows = inst.snapshot()
+        if rows:
+            st.dataframe(rows, use_container_width=True)
+        else:
+            st.caption("まだ記録がありません")
+
+
 # ロガー設定の適用
-setup_global_logger()
+USE_QUEUE_LOGGING = False  # True にするとキュー方式（整形と出力を別スレッドで行う）
+if USE_QUEUE_LOGGING:
+    # ファイルにも出すなら log_file="app.log" のように指定する
+    setup_queue_logger(rate_limits=(("tool1_logger", 50),))
+else:
+    setup_global_logger()
 
 # Streamlitのログを抑制（必要なら）
 logging.getLogger("streamlit").setLevel(logging.WARNING)
@@ -27,4 +381,17 @@ logging.getLogger("tool2_logger").setLevel(logging.DEBUG)
 
 # 各ツールからのログ出力例
 logging.getLogger("tool1_logger").info("Tool 1 is running.")
-logging.getLogger("tool2_logger").info("Tool 2 is running.")
\ No newline at end of file
+logging.getLogger("tool2_logger").info("Tool 2 is running.")
+
+# 計測の使い方例
+instrumentation = get_instrumentation()
+
+
+@instrumentation.instrument("tool1.process")
+def tool1_process():
+    time.sleep(0.01)
+
+
+with instrumentation.span("tool2.load"):
+    tool1_process()
+render_instrumentation_sidebar(instrumentation)
@@ -1,31 +1,175 @@
+import asyncio
+import os
 import threading
+import time
+import weakref
+
 
 class SingletonBase:
-    """スレッドセーフなシングルトン基底クラス"""
+    """
+    スレッドセーフなシングルトン基底クラス
+
+    - サブクラスごとに専用のロックとインスタンス置き場を持つ
+      （あるシングルトンの生成中に、別のシングルトンの取得が待たされない）
+    - 生成済みならロックを取らずに返す（ダブルチェックロッキング）
+    """
     _instance = None
     _lock = threading.Lock()
+    # fork 後にロックを作り直すための、全サブクラスの一覧
+    _registry = weakref.WeakSet()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._instance = None
+        cls._lock = threading.Lock()
+        SingletonBase._registry.add(cls)
 
     @classmethod
     def get_instance(cls, *args, **kwargs):
+        # 速い経路：生成済みならロック無しで返す
+        # （代入は生成が終わってから行うので、作りかけのインスタンスは見えない）
+        instance = cls._instance
+        if instance is not None:
+            return instance
         with cls._lock:
             if cls._instance is None:
                 cls._instance = cls(*args, **kwargs)
             return cls._instance
 
+    @classmethod
+    def _after_fork_in_child(cls):
+        """ fork した瞬間に別スレッドが持っていたロックは子で解放されないので作り直す """
+        cls._lock = threading.Lock()
+
+
+class ForkSafeSingletonBase(SingletonBase):
+    """
+    fork した子プロセスではインスタンスを作り直すシングルトン。
+    DB接続やスレッドプールなど、プロセスをまたいで共有してはいけないもの向け。
+    """
+    @classmethod
+    def _after_fork_in_child(cls):
+        super()._after_fork_in_child()
+        cls._instance = None
+
+
+def _reset_singletons_after_fork():
+    for klass in list(SingletonBase._registry):
+        klass._after_fork_in_child()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_singletons_after_fork)
+
+
+class AsyncSingletonBase:
+    """
+    asyncio 用のシングルトン基底クラス。
+    生成（create）が await を含んでも、同時に呼ばれたコルーチンは1つの生成を待つだけになる。
+    """
+    _instance = None
+    _lock = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._instance = None
+        cls._lock = None
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """ 非同期の初期化が必要なら、サブクラスでこれを上書きする """
+        return cls(*args, **kwargs)
+
+    @classmethod
+    async def get_instance(cls, *args, **kwargs):
+        instance = cls._instance
+        if instance is not None:
+            return instance
+        # ロックはイベントループ上で最初に必要になったときに作る
+        if cls._lock is None:
+            cls._lock = asyncio.Lock()
+        async with cls._lock:
+            if cls._instance is None:
+                cls._instance = await cls.create(*args, **kwargs)
+            return cls._instance
+
+
 # SingletonBaseを継承してシングルトンを実現
 class SingletonClass(SingletonBase):
     def __init__(self):
         print("インスタンス生成")
 
-# テストコード
-def create_instance():
-    instance = SingletonClass.get_instance()
-    print(f"インスタンスID: {id(instance)}")
 
-threads = [threading.Thread(target=create_instance) for _ in range(10)]
+# --- ベンチマーク用：毎回ロックを取る従来の実装 ---
+class LockingSingletonBase:
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, *args, **kwargs):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(*args, **kwargs)
+            return cls._instance
+
+
+class LockingSingletonClass(LockingSingletonBase):
+    pass
+
+
+class FastSingletonClass(SingletonBase):
+    pass
+
+
+def benchmark(klass, n_threads=64, n_calls=20000):
+    """ n_threads 本のスレッドから同時に get_instance を呼び、かかった秒数を返す """
+    start_barrier = threading.Barrier(n_threads + 1)
+
+    def worker():
+        start_barrier.wait()
+        get = klass.get_instance
+        for _ in range(n_calls):
+            get()
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t0
+
+
+if __name__ == "__main__":
+    # テストコード
+    def create_instance():
+        instance = SingletonClass.get_instance()
+        print(f"インスタンスID: {id(instance)}")
+
+    threads = [threading.Thread(target=create_instance) for _ in range(10)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    # 64スレッドでの取り合い
+    t_lock = benchmark(LockingSingletonClass)
+    t_fast = benchmark(FastSingletonClass)
+    print(f"毎回ロック: {t_lock:.3f}s / ロック無しの速い経路: {t_fast:.3f}s ({t_lock / t_fast:.1f}倍)")
+
+    # asyncio 版
+    class AsyncClient(AsyncSingletonBase):
+        @classmethod
+        async def create(cls):
+            await asyncio.sleep(0.1)  # 接続などの非同期の初期化
+            print("非同期インスタンス生成")
+            return cls()
 
-for thread in threads:
-    thread.start()
+    async def main():
+        clients = await asyncio.gather(*[AsyncClient.get_instance() for _ in range(10)])
+        print("同じインスタンス:", len({id(c) for c in clients}) == 1)
 
-for thread in threads:
-    thread.join()
\ No newline at end of file
+    asyncio.run(main())
@@ -1,3 +1,5 @@
+import threading
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import Canvas, Scale, HORIZONTAL
 from PIL import Image, ImageTk
@@ -9,44 +11,186 @@ image_paths = [
     "image3.jpg"
 ]
 
-def load_image(path):
+CANVAS_SIZE = (400, 400)          # キャンバスのサイズ（この大きさに縮小してキャッシュする）
+CACHE_BYTES = 256 * 1024 * 1024   # デコード済み画像キャッシュの上限（バイト）
+PREFETCH_AHEAD = 8                # ドラッグ方向に先読みする枚数
+PREFETCH_BEHIND = 2               # 逆方向に残しておく枚数
+
+
+def decode_image(path, size=CANVAS_SIZE):
     """
-    指定されたパスから画像を読み込み、PhotoImageに変換して返す関数。
+    指定されたパスから画像を読み込み、キャンバスに収まる大きさのPIL画像を返す関数。
+    JPEGは draft で縮小デコードされるので、フルサイズを展開するより大幅に速い。
+    （ワーカースレッドから呼ばれる。Tkには触らない）
     """
-    # 画像を開く（必要に応じてリサイズ等の処理を追加できます）
     img = Image.open(path)
-    # Tkinterで扱える形式に変換
-    return ImageTk.PhotoImage(img)
+    # JPEGならDCTの段階で 1/2, 1/4, 1/8 に縮小して読み込む
+    img.draft("RGB", size)
+    img.thumbnail(size)
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGB")
+    img.load()
+    return img
+
+
+class DecodedImageCache:
+    """
+    デコード済み画像のLRUキャッシュ（上限はバイト数）。
+    ワーカースレッドとメインスレッドの両方から使うのでロックで守る。
+    """
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()  # index -> (PIL画像, バイト数)
+        self._lock = threading.Lock()
 
-def update_image(index):
+    def get(self, index):
+        with self._lock:
+            item = self._items.get(index)
+            if item is None:
+                return None
+            self._items.move_to_end(index)
+            return item[0]
+
+    def __contains__(self, index):
+        with self._lock:
+            return index in self._items
+
+    def put(self, index, img):
+        nbytes = img.width * img.height * len(img.getbands())
+        with self._lock:
+            if index in self._items:
+                self.total_bytes -= self._items.pop(index)[1]
+            self._items[index] = (img, nbytes)
+            self.total_bytes += nbytes
+            # 古いものから追い出す（今入れたものは残す）
+            while self.total_bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, old_bytes) = self._items.popitem(last=False)
+                self.total_bytes -= old_bytes
+
+
+class PrefetchWorker:
     """
-    スライダーの値（index）に基づいて、キャンバス上の画像を更新する関数。
+    要求された画像と、ドラッグ方向の隣の画像をバックグラウンドでデコードするスレッド。
+    新しい要求が来たら、古い要求の先読みは途中でやめて新しい方を優先する。
     """
-    global current_image  # 画像の参照を保持してガベージコレクションを防ぐ
-    # リストから該当する画像パスを取得
-    path = image_paths[int(index)]
-    # 新しい画像を読み込む
-    current_image = load_image(path)
-    # キャンバス上の画像アイテムを更新（itemconfigで画像プロパティを変更）
-    canvas.itemconfig(image_on_canvas, image=current_image)
+    def __init__(self, paths, cache):
+        self.paths = paths
+        self.cache = cache
+        self._target = None
+        self._direction = 1
+        self.failed = set()      # 読み込めなかったインデックス
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def request(self, index, direction):
+        with self._cond:
+            self._target = index
+            self._direction = direction
+            self._cond.notify()
+
+    def _order(self, index, direction):
+        """ デコードする順番：要求された画像 → 進行方向 → 逆方向 """
+        ahead = [index + direction * k for k in range(1, PREFETCH_AHEAD + 1)]
+        behind = [index - direction * k for k in range(1, PREFETCH_BEHIND + 1)]
+        return [i for i in [index] + ahead + behind if 0 <= i < len(self.paths)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._target is None:
+                    self._cond.wait()
+                index, direction = self._target, self._direction
+                self._target = None
+
+            for i in self._order(index, direction):
+                with self._cond:
+                    if self._target is not None:
+                        break  # もっと新しい要求が来た
+                if i in self.cache or i in self.failed:
+                    continue
+                try:
+                    self.cache.put(i, decode_image(self.paths[i]))
+                except OSError as e:
+                    self.failed.add(i)
+                    print(f"読み込み失敗: {self.paths[i]} ({e})")
+
+
+class ImageSlider:
+    """
+    スライダーで画像を切り替えるビューア。
+    スライダーのイベントは間引いて、最後に指定された画像だけを描画する。
+    メインスレッドでは PhotoImage への変換だけを行う。
+    """
+    POLL_MS = 10  # デコード待ちのときの確認間隔
+
+    def __init__(self, root, paths):
+        self.root = root
+        self.paths = paths
+        self.cache = DecodedImageCache()
+        self.worker = PrefetchWorker(paths, self.cache).start()
+
+        # キャンバスの作成（適宜サイズを調整してください）
+        w, h = CANVAS_SIZE
+        self.canvas = Canvas(root, width=w, height=h)
+        self.canvas.pack()
+        # 画像の参照を保持してガベージコレクションを防ぐ
+        self.current_image = None
+        # 画像をキャンバスの中央に描画
+        self.image_on_canvas = self.canvas.create_image(w // 2, h // 2)
+
+        self.requested = 0      # 最後にスライダーで指定されたインデックス
+        self.shown = None       # 今表示しているインデックス
+        self._scheduled = False
+
+        # スライダーの値が変わるたびに update_image が呼ばれる
+        self.slider = Scale(root, from_=0, to=len(paths) - 1, orient=HORIZONTAL,
+                            command=self.update_image)
+        self.slider.pack()
 
-# メインウィンドウの作成
-root = tk.Tk()
-root.title("スライダーで画像更新")
+        self.update_image(0)
 
-# キャンバスの作成（適宜サイズを調整してください）
-canvas = Canvas(root, width=400, height=400)
-canvas.pack()
+    def update_image(self, index):
+        """
+        スライダーの値（index）を受け取る関数。
+        ここではインデックスを覚えてワーカーに依頼するだけで、描画はまとめて後で行う。
+        """
+        index = int(index)
+        direction = 1 if index >= self.requested else -1
+        self.requested = index
+        self.worker.request(index, direction)
+        if not self._scheduled:
+            self._scheduled = True
+            self.root.after_idle(self._render)
 
-# 初期画像の読み込みとキャンバスへの描画
-current_image = load_image(image_paths[0])
-# 画像をキャンバスの中央（x=200, y=200）に描画
-image_on_canvas = canvas.create_image(200, 200, image=current_image)
+    def _render(self):
+        """ 最新のインデックスの画像がデコード済みなら、キャンバスを更新する """
+        index = self.requested
+        if index == self.shown:
+            self._scheduled = False
+            return
+        img = self.cache.get(index)
+        if img is None and index in self.worker.failed:
+            self._scheduled = False
+            return
+        if img is None:
+            # まだデコード中なので少し待つ（その間に来たスライダー操作はまとめられる）
+            self.root.after(self.POLL_MS, self._render)
+            return
+        self._scheduled = False
+        self.current_image = ImageTk.PhotoImage(img)
+        self.canvas.itemconfig(self.image_on_canvas, image=self.current_image)
+        self.shown = index
 
-# Scaleウィジェットの作成
-# スライダーの値が変わるたびにupdate_image関数が呼ばれる
-slider = Scale(root, from_=0, to=len(image_paths)-1, orient=HORIZONTAL, command=update_image)
-slider.pack()
 
-# イベントループの開始
-root.mainloop()
+if __name__ == "__main__":
+    # メインウィンドウの作成
+    root = tk.Tk()
+    root.title("スライダーで画像更新")
+    viewer = ImageSlider(root, image_paths)
+    # イベントループの開始
+    root.mainloop()
@@ -1,33 +1,262 @@
-import pandas as pd
+from dataclasses import dataclass
+
 import numpy as np
 
-# 仮のデータフレーム: 各フレームの x, y 座標があるとする
-df = pd.DataFrame({
-    "frame": [0, 1, 2, 3, 4, 5],
-    "x":     [0.0, 1.0, 2.0, 2.5, 2.0, 1.5],
-    "y":     [0.0, 0.1, 0.2, 0.5, 0.8, 1.0],
-})
 
-# 1. 差分ベクトル（フレーム間の移動）
-df["dx"] = df["x"].diff()   # x方向の変化量
-df["dy"] = df["y"].diff()   # y方向の変化量
+@dataclass
+class HeadingMetrics:
+    """compute_heading_metrics の結果（行ごとの配列＋トラックごとの集計）"""
+    dx: np.ndarray              # x方向の変化量（各トラックの先頭は nan）
+    dy: np.ndarray              # y方向の変化量
+    heading_rad: np.ndarray     # 各区間の進行方向角度（ラジアン）
+    delta_heading: np.ndarray   # 方向変化量（-π〜π に正規化。各トラックの先頭2行は nan）
+    track_ids: np.ndarray       # トラックID（トラックごと、入力に出てきた順）
+    track_starts: np.ndarray    # 各トラックの先頭行のインデックス
+    zigzag_mean: np.ndarray     # 蛇行度(平均 abs Δheading)
+    zigzag_sum: np.ndarray      # 蛇行度(総量 abs Δheading)
+    zigzag_max: np.ndarray      # 蛇行度(最大 abs Δheading)
+
+
+def track_boundaries(track_id):
+    """トラックIDの並びから、各トラックの先頭行インデックスを返す"""
+    track_id = np.asarray(track_id)
+    if len(track_id) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.r_[True, track_id[1:] != track_id[:-1]])
+
+
+def compute_heading_metrics(track_id, frame, x, y, check_sorted=True):
+    """
+    複数トラックをまとめた縦長の配列（track_id, frame, x, y）から、
+    進行方向・方向変化量・トラックごとの蛇行度を一括で計算する。
+
+    入力は track_id ごとにまとまっていて、各トラック内は frame 昇順であること。
+    groupby-apply は使わず、全トラックまとめてベクトル演算し、
+    トラックの境目は nan で切ってから np.add.reduceat で集計する。
+    """
+    track_id = np.asarray(track_id)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    starts = track_boundaries(track_id)
+    if check_sorted and n:
+        frame = np.asarray(frame)
+        same_track = track_id[1:] == track_id[:-1]
+        if np.any(same_track & (frame[1:] <= frame[:-1])):
+            raise ValueError("各トラック内は frame 昇順に並べてください")
+        if len(np.unique(track_id[starts])) != len(starts):
+            raise ValueError("同じ track_id の行が連続していません（track_id でソートしてください）")
+
+    # 1. 差分ベクトル（フレーム間の移動）。トラックの先頭は前のトラックとの差なので捨てる
+    dx = np.empty(n)
+    dy = np.empty(n)
+    if n:
+        dx[0] = dy[0] = np.nan
+        np.subtract(x[1:], x[:-1], out=dx[1:])
+        np.subtract(y[1:], y[:-1], out=dy[1:])
+        dx[starts] = np.nan
+        dy[starts] = np.nan
+
+    # 2. 各区間の進行方向角度（ラジアン）
+    heading_rad = np.arctan2(dy, dx)
+
+    # 3. 連続する区間の方向変化量（先頭の nan が伝わるので、トラックの先頭2行は nan になる）
+    delta_heading = np.empty(n)
+    if n:
+        delta_heading[0] = np.nan
+        np.subtract(heading_rad[1:], heading_rad[:-1], out=delta_heading[1:])
+
+    # 4. 角度差を -π〜π に正規化
+    delta_heading = (delta_heading + np.pi) % (2 * np.pi) - np.pi
+
+    # 5. トラックごとの蛇行度（nan を除いた平均・合計・最大）
+    abs_delta = np.abs(delta_heading)
+    valid = ~np.isnan(abs_delta)
+    if n:
+        zigzag_sum = np.add.reduceat(np.where(valid, abs_delta, 0.0), starts)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        zigzag_max = np.maximum.reduceat(np.where(valid, abs_delta, -np.inf), starts)
+    else:
+        zigzag_sum = np.zeros(0)
+        counts = np.zeros(0, dtype=np.int64)
+        zigzag_max = np.zeros(0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        zigzag_mean = zigzag_sum / counts
+    zigzag_max[counts == 0] = np.nan
+
+    return HeadingMetrics(
+        dx=dx, dy=dy, heading_rad=heading_rad, delta_heading=delta_heading,
+        track_ids=track_id[starts], track_starts=starts,
+        zigzag_mean=zigzag_mean, zigzag_sum=zigzag_sum, zigzag_max=zigzag_max,
+    )
+
+
+def read_track_columns(source, columns=("track_id", "frame", "x", "y")):
+    """
+    Parquetファイル（パス）か Arrow の Table から、指定列を NumPy 配列で取り出す。
+    pandas を経由しないので、巨大なテーブルでも DataFrame を作らずに済む。
+    """
+    import pyarrow.parquet as pq
+
+    table = source if hasattr(source, "column") else pq.read_table(source, columns=list(columns))
+    return tuple(table.column(name).to_numpy() for name in columns)
+
+
+class StreamingZigzagTracker:
+    """
+    ライブのフィード（例: 100Hz、数千オブジェクト）向けに、
+    直近 window 個の abs Δheading の移動合計をオブジェクトごとに持つトラッカー。
+
+    状態はオブジェクトごとの Python オブジェクトではなく、スロット番号で引く配列に持つ。
+    1サンプルの更新は O(1)（リングバッファの1要素を入れ替えて合計を差分更新）。
+    """
+    def __init__(self, window=100, capacity=1024):
+        self.window = window
+        self._slots = {}                 # オブジェクトID -> スロット番号
+        self._free = []                  # 空いたスロット
+        self._size = 0                   # 使ったことのあるスロット数
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        """ 状態配列を capacity 行で確保する（足りなくなったら倍に広げる） """
+        old = getattr(self, "_capacity", 0)
+
+        def grow(arr, fill, dtype=float, shape=()):
+            new = np.full((capacity,) + shape, fill, dtype=dtype)
+            if old:
+                new[:old] = arr
+            return new
+
+        self.active = grow(getattr(self, "active", None), False, bool)
+        self.slot_ids = grow(getattr(self, "slot_ids", None), None, object)
+        self.prev_x = grow(getattr(self, "prev_x", None), np.nan)
+        self.prev_y = grow(getattr(self, "prev_y", None), np.nan)
+        self.prev_heading = grow(getattr(self, "prev_heading", None), np.nan)
+        self.ring = grow(getattr(self, "ring", None), 0.0, float, (self.window,))
+        self.ring_pos = grow(getattr(self, "ring_pos", None), 0, np.int64)
+        self.ring_count = grow(getattr(self, "ring_count", None), 0, np.int64)
+        self.rolling_sum = grow(getattr(self, "rolling_sum", None), 0.0)
+        self._capacity = capacity
+
+    def _slot(self, obj_id):
+        slot = self._slots.get(obj_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                if self._size == self._capacity:
+                    self._allocate(self._capacity * 2)
+                slot = self._size
+                self._size += 1
+            self._slots[obj_id] = slot
+            self.active[slot] = True
+            self.slot_ids[slot] = obj_id
+        return slot
+
+    def remove(self, obj_id):
+        """ 追跡をやめたオブジェクトのスロットを空けて、再利用できるようにする """
+        slot = self._slots.pop(obj_id)
+        self.active[slot] = False
+        self.slot_ids[slot] = None
+        self.prev_x[slot] = self.prev_y[slot] = self.prev_heading[slot] = np.nan
+        self.ring[slot] = 0.0
+        self.ring_pos[slot] = self.ring_count[slot] = 0
+        self.rolling_sum[slot] = 0.0
+        self._free.append(slot)
+
+    def update(self, obj_id, x, y):
+        """ 1サンプル分の更新 """
+        self._apply(np.array([self._slot(obj_id)]), np.array([x], dtype=float),
+                    np.array([y], dtype=float))
+
+    def update_batch(self, obj_ids, xs, ys):
+        """
+        複数オブジェクトのサンプルをまとめて更新する（並び順＝時刻順とみなす）。
+        同じIDが何度も出てくるときは、出てきた順に何回かに分けて適用する。
+        """
+        slots = np.fromiter((self._slot(i) for i in obj_ids), dtype=np.intp, count=len(obj_ids))
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        if len(slots) == 0:
+            return
+        # 各サンプルが同じスロットの中で何回目か（0, 1, 2, ...）
+        order = np.argsort(slots, kind="stable")
+        sorted_slots = slots[order]
+        group_start = np.r_[0, np.flatnonzero(sorted_slots[1:] != sorted_slots[:-1]) + 1]
+        first = np.repeat(group_start, np.diff(np.r_[group_start, len(slots)]))
+        rank = np.empty(len(slots), dtype=np.intp)
+        rank[order] = np.arange(len(slots)) - first
+        for r in range(rank.max() + 1):
+            sel = np.flatnonzero(rank == r)
+            self._apply(slots[sel], xs[sel], ys[sel])
+
+    def _apply(self, slots, x, y):
+        """ スロットが重複しないサンプル群をベクトル演算で反映する """
+        heading = np.arctan2(y - self.prev_y[slots], x - self.prev_x[slots])
+        delta = np.abs((heading - self.prev_heading[slots] + np.pi) % (2 * np.pi) - np.pi)
+        valid = ~np.isnan(delta)   # 直前の点と直前の向きがそろっているもの
+
+        s = slots[valid]
+        d = delta[valid]
+        pos = self.ring_pos[s]
+        # 窓が埋まっていれば、押し出される一番古い値を合計から引く
+        evicted = np.where(self.ring_count[s] == self.window, self.ring[s, pos], 0.0)
+        self.rolling_sum[s] += d - evicted
+        self.ring[s, pos] = d
+        pos = (pos + 1) % self.window
+        self.ring_pos[s] = pos
+        self.ring_count[s] = np.minimum(self.ring_count[s] + 1, self.window)
+        # 差分更新の丸め誤差がたまらないよう、リングが一周したら合計を取り直す
+        wrapped = s[pos == 0]
+        if len(wrapped):
+            self.rolling_sum[wrapped] = self.ring[wrapped].sum(axis=1)
+
+        self.prev_heading[slots] = heading
+        self.prev_x[slots] = x
+        self.prev_y[slots] = y
+
+    def query(self):
+        """
+        全オブジェクトの (ID, 直近window個の abs Δheading 合計, 平均) を NumPy 配列で返す。
+        まだ Δheading が1つも無いオブジェクトの平均は nan。
+        """
+        idx = np.flatnonzero(self.active[:self._size])
+        sums = self.rolling_sum[idx]
+        counts = self.ring_count[idx]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+        return self.slot_ids[idx], sums, means
 
-# 2. 各区間の進行方向角度（ラジアン）
-#    atan2(dy, dx) はベクトル (dx, dy) の向きの角度を返す
-df["heading_rad"] = np.arctan2(df["dy"], df["dx"])
+# --- 使い方例 ---
+if __name__ == "__main__":
+    import pandas as pd
 
-# 3. 連続する区間の方向変化量
-df["delta_heading"] = df["heading_rad"].diff()
+    # 仮のデータ: 2本のトラックの各フレームの x, y 座標があるとする
+    df = pd.DataFrame({
+        "track_id": [1, 1, 1, 1, 1, 1, 2, 2, 2, 2],
+        "frame":    [0, 1, 2, 3, 4, 5, 0, 1, 2, 3],
+        "x":        [0.0, 1.0, 2.0, 2.5, 2.0, 1.5, 0.0, 1.0, 2.0, 3.0],
+        "y":        [0.0, 0.1, 0.2, 0.5, 0.8, 1.0, 0.0, 1.0, 0.0, 1.0],
+    })
+    # Parquet から読む場合:
+    # track_id, frame, x, y = read_track_columns("tracks.parquet")
 
-# 4. 角度差を -π〜π に正規化（例えば 190° → -170° に変換）
-df["delta_heading"] = (df["delta_heading"] + np.pi) % (2*np.pi) - np.pi
+    m = compute_heading_metrics(df["track_id"].to_numpy(), df["frame"].to_numpy(),
+                                df["x"].to_numpy(), df["y"].to_numpy())
 
-# 5. 蛇行の強さの指標（例）
-#    - 絶対値の平均 → 1フレームごとの平均的な曲がり具合
-#    - 絶対値の合計 → 全区間でどれくらい曲がったか
-zigzag_mean = df["delta_heading"].abs().mean(skipna=True)
-zigzag_sum  = df["delta_heading"].abs().sum(skipna=True)
+    df["dx"], df["dy"] = m.dx, m.dy
+    df["heading_rad"], df["delta_heading"] = m.heading_rad, m.delta_heading
+    print(df[["track_id", "frame", "x", "y", "dx", "dy", "heading_rad", "delta_heading"]])
+    print(pd.DataFrame({
+        "track_id": m.track_ids,
+        "蛇行度(平均 abs Δheading)": m.zigzag_mean,
+        "蛇行度(総量 abs Δheading)": m.zigzag_sum,
+        "蛇行度(最大 abs Δheading)": m.zigzag_max,
+    }))
 
-print(df[["frame", "x", "y", "dx", "dy", "heading_rad", "delta_heading"]])
-print("蛇行度(平均 abs Δheading):", zigzag_mean)
-print("蛇行度(総量   abs Δheading):", zigzag_sum)
\ No newline at end of file
+    # ライブのフィードでは、直近Nフレームの蛇行度をオブジェクトごとに更新していく
+    tracker = StreamingZigzagTracker(window=3)
+    tracker.update_batch(df["track_id"], df["x"], df["y"])
+    ids, sums, means = tracker.query()
+    print("直近3フレームの蛇行度:", dict(zip(ids, sums)))
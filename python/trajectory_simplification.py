@@ -0,0 +1,237 @@
+"""
+過剰サンプリングされた軌跡（例: 低速車両の 1kHz GNSS）を、
+進行方向解析（trajectory_heading_analysis）や後退検知（detect_backward_movement_from_pose）、
+曲がり角判定（CalcDisconnectLine.local_theta）に渡す前に間引くための前処理。
+
+1) decimate_by_distance : 累積走行距離で一定間隔ごとに1点だけ残す高速な前段
+2) rdp_indices           : Ramer–Douglas–Peucker（再帰もスタックも使わず、未確定の全区間を1段ずつベクトル演算で処理）
+3) visvalingam_indices   : Visvalingam–Whyatt（三角形の面積が小さい点から削る）
+
+どの関数も「残した点の元のインデックス」を返すので、frame 番号などに対応付けられる。
+
+使い方：
+    result = simplify_trajectory(points, epsilon=0.05, min_dist=0.01)
+    result.indices            # 元の点列に対するインデックス
+    result.reduction_ratio    # 残った点の割合
+    result.max_deviation      # 間引きで生じた最大のずれ（元の点 → 簡略化後の折れ線）
+"""
+
+from __future__ import annotations
+
+import heapq
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SimplifiedTrajectory:
+    """簡略化の結果"""
+    indices: np.ndarray         # 残した点の元のインデックス（昇順）
+    points: np.ndarray          # 残した点の座標
+    reduction_ratio: float      # 残った点数 / 元の点数
+    max_deviation: float        # 元の点から簡略化後の折れ線までの距離の最大値
+
+
+def _as_points(points) -> np.ndarray:
+    p = np.asarray(points, dtype=float)
+    if p.ndim != 2:
+        raise ValueError("points は (N, D) の配列にしてください")
+    return p
+
+
+def _segment_distances(p: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """点群 p から線分 a-b までの距離（a, b は p と同じ形でも1点でもよい）"""
+    ab = b - a
+    ap = p - a
+    denom = np.einsum("...i,...i->...", ab, ab)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.einsum("...i,...i->...", ap, ab) / denom
+    # 長さ0の線分は端点までの距離
+    t = np.clip(np.nan_to_num(t, nan=0.0), 0.0, 1.0)
+    closest = a + t[..., None] * ab
+    return np.linalg.norm(p - closest, axis=-1)
+
+
+def decimate_by_distance(points, min_dist: float) -> np.ndarray:
+    """
+    累積走行距離が min_dist 進むごとに1点だけ残す（最初と最後の点は必ず残す）。
+    「直前に残した点からの距離」で逐次判定する方法と違い、ループ無しで計算できる。
+    """
+    p = _as_points(points)
+    n = len(p)
+    if n <= 2 or min_dist <= 0:
+        return np.arange(n)
+    step = np.linalg.norm(np.diff(p, axis=0), axis=1)
+    cum = np.r_[0.0, np.cumsum(step)]
+    bucket = np.floor(cum / min_dist).astype(np.int64)
+    keep = np.r_[True, bucket[1:] != bucket[:-1]]
+    keep[-1] = True
+    return np.flatnonzero(keep)
+
+
+def rdp_indices(points, epsilon: float) -> np.ndarray:
+    """
+    Ramer–Douglas–Peucker で残す点のインデックスを返す。
+    再帰やスタックの代わりに「未確定の区間」を点ごとの印でまとめて持ち、1回のループで
+    その段の全区間の距離計算と最大点の選択をベクトル演算で行う（ループ回数＝再帰の深さ）。
+    距離は「直線」ではなく「線分」までの距離なので、往復や後退も潰さずに残る。
+    """
+    p = _as_points(points)
+    n = len(p)
+    if n <= 2:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    pending = np.ones(n, dtype=bool)   # まだ確定していない区間の内側にある点
+    while True:
+        pts = np.flatnonzero(pending & ~keep)
+        if len(pts) == 0:
+            break
+        kept = np.flatnonzero(keep)
+        seg = np.searchsorted(kept, pts) - 1
+        d = _segment_distances(p[pts], p[kept[seg]], p[kept[seg + 1]])
+
+        # 区間ごとの最大距離と、その最初の位置
+        starts = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+        counts = np.diff(np.r_[starts, len(pts)])
+        seg_max = np.maximum.reduceat(d, starts)
+        is_max = d == np.repeat(seg_max, counts)
+        _, first = np.unique(seg[is_max], return_index=True)
+        argmax = np.flatnonzero(is_max)[first]
+
+        split = seg_max > epsilon
+        keep[pts[argmax[split]]] = True
+        # 最大距離が epsilon 以下の区間は確定（中の点は捨てる）
+        pending[pts[np.repeat(~split, counts)]] = False
+    return np.flatnonzero(keep)
+
+
+def _triangle_area(a, b, c) -> float:
+    """3点が作る三角形の面積（D次元対応。点は float のリスト）"""
+    u = [bi - ai for ai, bi in zip(a, b)]
+    v = [ci - ai for ai, ci in zip(a, c)]
+    uu = sum(x * x for x in u)
+    vv = sum(x * x for x in v)
+    uv = sum(x * y for x, y in zip(u, v))
+    return 0.5 * max(uu * vv - uv * uv, 0.0) ** 0.5
+
+
+def visvalingam_indices(points, min_area: float) -> np.ndarray:
+    """
+    Visvalingam–Whyatt で残す点のインデックスを返す。
+    実効面積が min_area 未満の点を、小さいものから順に削る（ヒープ＋双方向リンク）。
+    初期面積はベクトル演算で求め、削ったあとの隣の再計算だけを1点ずつ行う。
+    """
+    p = _as_points(points)
+    n = len(p)
+    if n <= 2:
+        return np.arange(n)
+    pl = p.tolist()
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    removed = np.zeros(n, dtype=bool)
+
+    u = p[1:-1] - p[:-2]
+    v = p[2:] - p[:-2]
+    uu = np.einsum("ij,ij->i", u, u)
+    vv = np.einsum("ij,ij->i", v, v)
+    uv = np.einsum("ij,ij->i", u, v)
+    areas = [float("inf")] + (0.5 * np.sqrt(np.maximum(uu * vv - uv * uv, 0.0))).tolist() + [float("inf")]
+    heap = [(areas[i], i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+
+    last_area = 0.0
+    while heap:
+        area, i = heapq.heappop(heap)
+        if removed[i] or area != areas[i]:
+            continue  # 古いエントリ
+        if area >= min_area:
+            break
+        # 直前に削った点より小さくならないようにする（元論文の実効面積）
+        last_area = max(last_area, area)
+        removed[i] = True
+        a, b = prev[i], nxt[i]
+        nxt[a] = b
+        prev[b] = a
+        for j in (a, b):
+            if 0 < j < n - 1:
+                areas[j] = max(_triangle_area(pl[prev[j]], pl[j], pl[nxt[j]]), last_area)
+                heapq.heappush(heap, (areas[j], j))
+    return np.flatnonzero(~removed)
+
+
+def max_deviation(points, indices) -> float:
+    """元の各点から、それを挟む残った2点の線分までの距離の最大値"""
+    p = _as_points(points)
+    indices = np.asarray(indices)
+    if len(indices) < 2:
+        return 0.0
+    i = np.arange(indices[0], indices[-1] + 1)
+    seg = np.clip(np.searchsorted(indices, i, side="right") - 1, 0, len(indices) - 2)
+    d = _segment_distances(p[i], p[indices[seg]], p[indices[seg + 1]])
+    return float(d.max())
+
+
+def simplify_trajectory(points, epsilon: float, method: str = "rdp",
+                        min_dist: float | None = None) -> SimplifiedTrajectory:
+    """
+    軌跡を簡略化する。min_dist を指定すると、先に距離ベースの間引きをかけてから
+    本処理（method="rdp" なら epsilon は距離、"visvalingam" なら面積のしきい値）を行う。
+    返すインデックスと max_deviation は元の点列に対するもの。
+    """
+    p = _as_points(points)
+    idx = np.arange(len(p)) if min_dist is None else decimate_by_distance(p, min_dist)
+
+    if method == "rdp":
+        sub = rdp_indices(p[idx], epsilon)
+    elif method == "visvalingam":
+        sub = visvalingam_indices(p[idx], epsilon)
+    else:
+        raise ValueError(f"未対応の method です: {method}")
+    idx = idx[sub]
+
+    return SimplifiedTrajectory(
+        indices=idx,
+        points=p[idx],
+        reduction_ratio=len(idx) / len(p) if len(p) else 1.0,
+        max_deviation=max_deviation(p, idx),
+    )
+
+
+def simplify_tracks(track_id, points, epsilon: float, method: str = "rdp",
+                    min_dist: float | None = None):
+    """
+    track_id ごとにまとまった縦長の点列を、トラックごとに簡略化する。
+    戻り値は (残す行のマスク, 全体の reduction_ratio, 全体の max_deviation)。
+    マスクで frame などの他の列も一緒に絞れる。
+    """
+    track_id = np.asarray(track_id)
+    p = _as_points(points)
+    n = len(p)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep, 1.0, 0.0
+    starts = np.flatnonzero(np.r_[True, track_id[1:] != track_id[:-1]])
+    ends = np.r_[starts[1:], n]
+    worst = 0.0
+    for s, e in zip(starts, ends):
+        r = simplify_trajectory(p[s:e], epsilon, method=method, min_dist=min_dist)
+        keep[s + r.indices] = True
+        worst = max(worst, r.max_deviation)
+    return keep, float(keep.sum()) / n, worst
+
+
+# --- 使い方例 ---
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    # 1kHz で記録したゆっくりした S 字走行（ノイズ入り）
+    t = np.linspace(0, 10, 10_000)
+    xy = np.c_[t, np.sin(t)] + rng.normal(0, 0.002, size=(len(t), 2))
+    frames = np.arange(len(t))
+
+    for method, eps in [("rdp", 0.01), ("visvalingam", 1e-4)]:
+        res = simplify_trajectory(xy, epsilon=eps, method=method, min_dist=0.005)
+        print(f"{method}: {len(xy)} → {len(res.indices)} 点 "
+              f"(残存率 {res.reduction_ratio:.4f}, 最大ずれ {res.max_deviation:.4f})")
+        print("  残した frame（先頭5つ）:", frames[res.indices][:5])